@@ -0,0 +1,431 @@
+from __future__ import annotations
+import asyncio, time, urllib.parse, logging, weakref, threading, atexit
+from concurrent.futures import CancelledError
+from contextlib import asynccontextmanager
+from typing import Callable
+import aiohttp, google.generativeai as genai
+import backend, services, metrics, cancel
+
+SEARCH_CONCURRENCY = 256
+
+Emit = Callable[[object], None]
+
+def _drop(_):
+    pass
+
+class _LoopState:
+    def __init__(self):
+        self.http: aiohttp.ClientSession | None = None
+        self.slots = {k: asyncio.Semaphore(v) for k, v in services.SERVICE_CONCURRENCY.items()}
+        self.searches = asyncio.Semaphore(SEARCH_CONCURRENCY)
+        self.essays = asyncio.Semaphore(backend.WORKERS)
+
+    def session(self) -> aiohttp.ClientSession:
+        if self.http is None or self.http.closed:
+            connect, read = services.TRANSPORT.timeout
+            self.http = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=services.TRANSPORT.pool_size),
+                timeout=aiohttp.ClientTimeout(sock_connect=connect, sock_read=read))
+        return self.http
+
+_LOOP: asyncio.AbstractEventLoop | None = None
+_LOOP_THREAD: threading.Thread | None = None
+_SHARED: _LoopState | None = None
+_LOOP_LOCK = threading.Lock()
+_STATES: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+def _loop() -> asyncio.AbstractEventLoop:
+    global _LOOP, _LOOP_THREAD, _SHARED
+    with _LOOP_LOCK:
+        if _LOOP is None:
+            _LOOP, _SHARED = asyncio.new_event_loop(), _LoopState()
+            _LOOP_THREAD = threading.Thread(target=_LOOP.run_forever, name="aio-loop", daemon=True)
+            _LOOP_THREAD.start()
+            atexit.register(close)
+        return _LOOP
+
+def _state() -> _LoopState:
+    loop = asyncio.get_running_loop()
+    if loop is _LOOP:
+        return _SHARED
+    st = _STATES.get(loop)
+    if st is None:
+        st = _STATES[loop] = _LoopState()
+    return st
+
+async def aclose():
+    loop = asyncio.get_running_loop()
+    st = _SHARED if loop is _LOOP else _STATES.pop(loop, None)
+    if st and st.http:
+        http, st.http = st.http, None
+        await http.close()
+
+def reset_session():
+    if _LOOP is not None and _LOOP.is_running():
+        asyncio.run_coroutine_threadsafe(aclose(), _LOOP)
+
+def close():
+    global _LOOP
+    with _LOOP_LOCK:
+        loop, _LOOP = _LOOP, None
+    if loop is None:
+        return
+    http = _SHARED.http if _SHARED else None
+    try:
+        if http is not None:
+            asyncio.run_coroutine_threadsafe(http.close(), loop).result(5)
+    except Exception as e:
+        logging.debug("aio close: %s", e)
+    loop.call_soon_threadsafe(loop.stop)
+
+def connections() -> dict[str, int]:
+    http = _SHARED.http if _SHARED else None
+    if http is None or http.closed:
+        return {}
+    out = {}
+    for k, conns in getattr(http.connector, "_conns", {}).items():
+        host = k.host if k.port in (80, 443) else f"{k.host}:{k.port}"
+        out[host] = out.get(host, 0) + len(conns)
+    return out
+
+def run(coro, token: cancel.CancelToken | None = None):
+    loop = _loop()
+    if threading.current_thread() is _LOOP_THREAD:
+        raise RuntimeError("aio_backend.run() called from the shared event loop; await the coroutine instead")
+    async def _main():
+        with cancel.scope(token):
+            return await coro
+    fut = asyncio.run_coroutine_threadsafe(_main(), loop)
+    unhook = token.on_cancel(fut.cancel) if token else None
+    try:
+        return fut.result()
+    except CancelledError:
+        if token and token.cancelled:
+            raise cancel.Cancelled() from None
+        raise
+    finally:
+        if unhook:
+            unhook()
+
+@asynccontextmanager
+async def _slot(service: str):
+    async with _state().slots[service]:
+        delay = services.BUCKETS[service].reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        yield
+
+async def _send(service: str, method: str, url: str, **kw) -> tuple[int, dict, str]:
+    host = urllib.parse.urlsplit(url).netloc.lower()
+    http = _state().session()
+    for attempt in range(services.RETRY_429 + 1):
+        cancel.check()
+        async with _slot(service):
+            cancel.check()
+            t = time.perf_counter()
+            try:
+                async with http.request(method, url, **kw) as r:
+                    status, headers, text = r.status, r.headers, await r.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                services.TRANSPORT.record(host, time.perf_counter() - t, True)
+                raise
+            services.TRANSPORT.record(host, time.perf_counter() - t, status >= 400)
+        if status != 429 or attempt == services.RETRY_429:
+            break
+        services.backoff(service, headers)
+    return status, headers, text
+
+async def _http_get(service: str, endpoint: str, url: str, params: dict | None = None, headers: dict | None = None) -> str | None:
+    with metrics.span(f"http.{endpoint}") as sp:
+        ck, entry, body, hdrs = await asyncio.to_thread(services.http_prepare, endpoint, url, params, headers)
+        if body is not None:
+            sp["cache"] = "hit"
+            return body
+        try:
+            status, rh, text = await _send(service, "GET", url, headers=hdrs, params=params)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.error("%s %s: %s", service, endpoint, e or type(e).__name__)
+            sp["error"] = True
+            return entry["body"] if entry else None
+        if status >= 400:
+            logging.error("%s %s: HTTP %s", service, endpoint, status)
+            sp["error"] = True
+            return entry["body"] if entry else None
+        sp["cache"] = "revalidated" if status == 304 else "miss"
+        sp["bytes"] = len(text.encode("utf-8"))
+        return await asyncio.to_thread(services.http_finish, ck, entry, status, rh, text)
+
+async def _http_json(service: str, endpoint: str, url: str, params: dict | None = None, headers: dict | None = None):
+    return services.loads(service, endpoint, await _http_get(service, endpoint, url, params, headers))
+
+async def _arxiv_feed(endpoint: str, params: dict):
+    body = await _http_get("arxiv", endpoint, backend.ARXIV_API, params, backend.UA)
+    return await asyncio.to_thread(backend._parse_feed, body)
+
+async def generate(prompt: str, on_chunk=None, json_mode: bool = False) -> str:
+    if not prompt.strip():
+        return ""
+    with metrics.span("gemini.json" if json_mode else "gemini.text") as sp:
+        ck = services.gemini_key(prompt, json_mode)
+        hit = await asyncio.to_thread(services.cached, ck)
+        if hit is not None:
+            sp["cache"] = "hit"
+            if on_chunk:
+                on_chunk(hit)
+            return hit
+        while True:
+            flight, lead = services.flight(ck)
+            if lead:
+                break
+            flight.follow(on_chunk)
+            text = None
+            try:
+                text = await asyncio.shield(asyncio.wrap_future(flight.future))
+            finally:
+                flight.unfollow(on_chunk, text)
+            if text is not None:
+                sp["cache"] = "hit"
+                return text
+        text = None
+        try:
+            text = await _gemini_call(prompt, flight, on_chunk, json_mode, sp)
+            return text
+        finally:
+            services.land(ck, flight, text)
+
+async def _gemini_call(prompt: str, flight: services.Flight, on_chunk, json_mode: bool, sp: dict) -> str:
+    if not services.configure_gemini():
+        return ""
+    sp["cache"] = "miss"
+    flight.follow(on_chunk)
+    parts = []
+    t0 = time.perf_counter()
+    try:
+        cfg = services.gemini_config(json_mode)
+        async with _slot("gemini"):
+            cancel.check()
+            t0 = time.perf_counter()
+            model = genai.GenerativeModel(services.GEMINI_MODEL)
+            if on_chunk is None:
+                parts.append(services.rsp_text(await model.generate_content_async(prompt, generation_config=cfg)))
+            else:
+                async for chunk in await model.generate_content_async(prompt, generation_config=cfg, stream=True):
+                    t = services.rsp_text(chunk)
+                    if t:
+                        parts.append(t)
+                        flight.chunk(t)
+    except Exception as e:
+        services.TRANSPORT.record(services.GEMINI_HOST, time.perf_counter() - t0, True)
+        logging.error("Gemini: %s", e)
+        sp["error"] = True
+        return "".join(parts)
+    services.TRANSPORT.record(services.GEMINI_HOST, time.perf_counter() - t0, False)
+    text = "".join(parts)
+    sp["bytes"] = len(text.encode("utf-8"))
+    if services.cacheable(text, json_mode):
+        await asyncio.to_thread(services.store, services.gemini_key(prompt, json_mode), text)
+    return text
+
+async def gemini_essay(abs_: str, on_chunk=None) -> str:
+    return (await generate(backend._essay_prompt(abs_), on_chunk)).strip()
+
+async def gemini_analysis(abs_: str, on_chunk=None, essay_fallback: bool = True) -> dict:
+    stream = backend._EssayStream()
+    res = backend._analysis_from(await generate(backend._analysis_prompt(abs_), stream.forward(on_chunk), json_mode=True), stream)
+    if not res["essay"] and essay_fallback:
+        res["essay"] = await gemini_essay(abs_, on_chunk)
+    return res
+
+async def _essay(p: dict, emit: Emit, key: str | None = None) -> str:
+    if not p["abstract"]:
+        return ""
+    pid = key or p["paperId"]
+    async with _state().essays:
+        with metrics.span("stage.essay"):
+            return (await gemini_analysis(p["abstract"], lambda t: emit(("essay_chunk", (pid, t)))))["essay"]
+
+_chars_per_token: float | None = None
+
+async def _token_sizes(texts: list[str]) -> list[int]:
+    global _chars_per_token
+    if _chars_per_token is None:
+        joined = "\n".join(texts)
+        try:
+            with metrics.span("gemini.count_tokens"):
+                async with _slot("gemini"):
+                    model = genai.GenerativeModel(services.GEMINI_MODEL)
+                    total = (await asyncio.to_thread(model.count_tokens, joined)).total_tokens
+            _chars_per_token = len(joined) / max(1, total)
+        except Exception as e:
+            logging.warning("Gemini token count: %s", e)
+            return [len(t) // 4 + 1 for t in texts]
+    return [int(len(t) / _chars_per_token) + 1 for t in texts]
+
+async def _essay_batch(papers: list[dict]) -> dict[str, str]:
+    async with _state().essays:
+        with metrics.span("stage.essay_batch"):
+            raw = await generate(backend._batch_prompt(papers), json_mode=True)
+    return {pid: res["essay"] for pid, res in (await asyncio.to_thread(backend._parse_batch, raw, papers)).items()}
+
+async def _batched_essays(papers: list[dict], budget: int) -> dict[str, asyncio.Task]:
+    todo = await asyncio.to_thread(lambda: [p for p in papers if p["abstract"] and not p.get("insights") and
+                                            services.cached(services.gemini_key(backend._analysis_prompt(p["abstract"]), True)) is None])
+    if len(todo) < 2 or not services.configure_gemini():
+        return {}
+    sizes = await _token_sizes([backend._batch_prompt([])] + [p["abstract"] for p in todo])
+    tasks = {}
+    for batch in backend._pack_batches(todo, sizes[1:], sizes[0], budget):
+        if len(batch) > 1:
+            t = asyncio.create_task(_essay_batch(batch))
+            tasks.update((p["paperId"], t) for p in batch)
+    return tasks
+
+async def _s2_search(query: str, limit: int, key: str, cursor: dict) -> list[dict]:
+    if cursor["s2"] is None or limit <= 0:
+        return []
+    url, params, headers = backend._s2_search_args(query, limit, key, cursor["s2"])
+    data = await _http_json("s2", "s2_search", url, params, headers)
+    if data is not None:
+        cursor["s2"] = data.get("next")
+    return backend._s2_rows(data)
+
+async def _arxiv_search(query: str, limit: int, cursor: dict):
+    if cursor["arxiv"] is None or limit <= 0:
+        return []
+    limit = min(limit, backend.MAX_PER_QUERY_ARXIV)
+    feed = await _arxiv_feed("arxiv_search", backend._arxiv_search_params(query, limit, cursor["arxiv"]))
+    if feed is None:
+        return []
+    entries = getattr(feed, "entries", [])[:limit]
+    cursor["arxiv"] = cursor["arxiv"] + len(entries) if len(entries) == limit else None
+    return entries
+
+async def _s2_details(pid: str, key: str) -> dict | None:
+    data = await asyncio.to_thread(backend._s2_fresh, pid) or await asyncio.shield(asyncio.wrap_future(backend._S2_BATCHER.submit(pid, key)))
+    return backend._mk_s2(data) if data else None
+
+async def _remote_search(query: str, n: int, cursor: dict) -> list[dict]:
+    with metrics.span("search.remote"):
+        return await _remote_page(query, n, cursor)
+
+async def _remote_page(query: str, n: int, cursor: dict) -> list[dict]:
+    key = backend._s2_key()
+    if not key:
+        cursor["s2"] = None
+    seen = set(cursor["seen"])
+    s2_results = await _s2_search(query, n // 2, key, cursor)
+    arxiv_results = await _arxiv_search(query, n - len(s2_results), cursor)
+    groups = backend._dedup(arxiv_results, s2_results, set(seen))
+    for _ in range(backend.BACKFILL_ROUNDS):
+        missing = n - len(groups)
+        if missing <= 0:
+            break
+        more = await _arxiv_search(query, missing, cursor)
+        arxiv_results += more
+        if not more:
+            more = await _s2_search(query, missing, key, cursor)
+            s2_results += more
+        if not more:
+            break
+        groups = backend._dedup(arxiv_results, s2_results, set(seen))
+    backend._dedup(arxiv_results, s2_results, seen)
+    cursor["seen"] = list(seen)
+    papers = [p for p in (backend._mk_merged(e, d) for e, d in groups) if p]
+    await asyncio.to_thread(backend._index_papers, papers)
+    return papers
+
+async def search_papers_async(query: str, n: int, emit: Emit | None = None, mode: str = "remote", cursor: dict | None = None,
+                              batch_tokens: int = 0) -> list[dict]:
+    emit = emit or _drop
+    cursor = cursor or backend.new_cursor(query, mode)
+    async with _state().searches:
+        base = cursor["count"]
+        emit(("status", f"Searching “{query}”…" if not base else f"Loading more results for “{query}”…"))
+        mode, local = cursor["mode"], []
+        want_local = n if mode == "local" else n // 2 if mode == "hybrid" else 0
+        if want_local and cursor["local"] is not None:
+            seen = set(cursor["seen"])
+            with metrics.span("search.local"):
+                hits = await asyncio.to_thread(backend._local_search, query, want_local, cursor["local"])
+            if hits is not None:
+                cursor["local"] = cursor["local"] + want_local if len(hits) == want_local else None
+            local = [p for p in hits or () if "id:" + p["paperId"] not in seen]
+            cursor["seen"] += [k for p in local for k in backend._paper_keys(p)]
+        remote = await _remote_search(query, n - len(local), cursor) if mode != "local" else []
+        papers = backend._merge_hits(remote, local)
+        cursor["seen"] += ["id:" + p["paperId"] for p in papers]
+        await asyncio.to_thread(backend._note_page, [k[3:] for k in cursor["seen"] if k.startswith("id:")])
+        cursor["count"] += len(papers)
+        cursor["done"] = cursor["arxiv"] is None and cursor["s2"] is None and cursor["local"] is None
+        if not papers:
+            if not cursor["done"]:
+                emit(("status", "Search sources did not respond, try Load more"))
+            else:
+                emit(("status", "No more results" if base else "No papers found"))
+            emit(("metrics", metrics.snapshot()))
+            return []
+        for i, p in enumerate(papers, base):
+            emit(("paper_added", (i, dict(p))))
+        total = len(papers)
+        emit(("status", f"Found {total} papers, analysing…"))
+        done = 0
+        batched = await _batched_essays(papers, batch_tokens) if batch_tokens else {}
+
+        async def _one(i: int, p: dict):
+            nonlocal done
+            stored = p.get("insights") or None
+            try:
+                essay = stored
+                if essay is None and p["paperId"] in batched:
+                    try:
+                        essay = (await batched[p["paperId"]]).get(p["paperId"])
+                    except Exception as e:
+                        logging.error("Essay batch: %s", e)
+                p["insights"] = essay if essay is not None else await _essay(p, emit)
+            except Exception as e:
+                logging.error("Essay %s: %s", p["paperId"], e)
+                p["insights"] = ""
+            if not stored:
+                await asyncio.to_thread(backend._index_insights, p["paperId"], p["insights"])
+            done += 1
+            emit(("paper_updated", (i, {"paperId": p["paperId"], "insights": p["insights"]})))
+            emit(("status", f"Processing {done}/{total} ({p['source']})"))
+
+        await asyncio.gather(*(_one(i, p) for i, p in enumerate(papers, base)))
+        emit(("status", f"Analysis complete ({total} papers)"))
+        emit(("metrics", metrics.snapshot()))
+        return papers
+
+async def fetch_paper_details_async(pid: str, emit: Emit | None = None) -> dict | None:
+    emit = emit or _drop
+    if not pid:
+        emit(("paper_details_error", (pid, "Invalid ID")))
+        return None
+    emit(("status", f"Fetching {pid}…"))
+    out = None
+    if pid.startswith("arXiv:"):
+        with metrics.span("stage.details"):
+            feed = await _arxiv_feed("arxiv_id", {"id_list": pid[6:], "max_results": 1})
+        if getattr(feed, "entries", []):
+            out = backend._mk_arxiv(feed.entries[0])
+    elif pid.startswith("S2:"):
+        key = backend._s2_key()
+        if not key:
+            emit(("paper_details_error", (pid, "SEMANTIC_API missing")))
+            return None
+        with metrics.span("stage.details"):
+            out = await _s2_details(pid[3:], key)
+    if not out and backend._INDEX:
+        out = await asyncio.to_thread(backend._INDEX.get, pid)
+    if not out:
+        emit(("paper_details_error", (pid, f"Details not found for {pid}")))
+        return None
+    await asyncio.to_thread(backend._index_papers, [out])
+    out.update(await asyncio.to_thread(backend.citation_edges, pid, False))
+    emit(("paper_details", (pid, dict(out))))
+    emit(("status", f"Details ready for {pid}"))
+    out["insights"] = await _essay(out, emit, pid)
+    await asyncio.to_thread(backend._index_insights, out["paperId"], out["insights"])
+    emit(("essay_done", (pid, out["insights"])))
+    emit(("metrics", metrics.snapshot()))
+    return out
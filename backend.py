@@ -1,85 +1,416 @@
 from __future__ import annotations
-import os, time, re, html, urllib.parse, logging, string
+import os, time, re, html, json, urllib.parse, logging, string, threading
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
 from queue import Queue
-import feedparser, requests, google.generativeai as genai
+import feedparser, requests
+import cache, ratelimit, services, index, similar, graph, metrics, cancel, aio_backend
 
 ARXIV_API = "http://export.arxiv.org/api/query"
 S2_API = "https://api.semanticscholar.org/graph/v1"
 REL_LIMIT = 4
-GEMINI_MODEL = "gemini-1.5-flash-latest"
-DELAY_S = 1.1
+WORKERS = 8
+METRICS_FILE = os.getenv("RA_METRICS_FILE")
 MAX_PER_QUERY_ARXIV = 50
 MAX_PER_QUERY_S2 = 100
+S2_FIELDS = "paperId,url,title,abstract,authors,year,venue,citationCount,influentialCitationCount,externalIds"
+BACKFILL_ROUNDS = 2
+S2_BATCH_MAX = 500
+S2_BATCH_WINDOW_S = 0.05
+EDGE_FIELDS = "paperId,title,year,references.paperId,references.title,references.year,citations.paperId,citations.title,citations.year"
+EDGE_BATCH_MAX = 100
+GRAPH_TTL = 7 * 86400
+TITLE_WORKERS = 4
+TITLE_MEMO_MAX = 2048
+RELATED_WORKERS = 2
+RELATED_MEMO_MAX = 512
+PAGE_MEMO_MAX = 4096
+DETAIL_WORKERS = 5
+DETAIL_CACHE_MAX = 64
+PREFETCH_PER_MIN = 12
+PREFETCH_QUEUE_MAX = 8
+PREFETCH_IDLE_POLL_S = 0.25
+HEDGE_DELAY_S = 1.0
+ESSAY_BATCH_TOKENS = 6000
+ESSAY_BATCH_MAX = 5
+ESSAY_OUTPUT_TOKENS = 2000
+CASCADE_WORKERS = 8
+SEARCH_MODES = ("remote", "local", "hybrid")
 UA = {"User-Agent": "ResearchAssistantApp/1.0 (mailto:you@example.com)"}
 
 logging.basicConfig(level=logging.INFO, format="%(levelname)s %(asctime)s %(message)s", datefmt="%H:%M:%S")
 
-def _once(fn):
-    done = False
-    value = None
-    def _wrapper(*a, **kw):
-        nonlocal done, value
-        if not done:
-            value, done = fn(*a, **kw), True
-        return value
-    return _wrapper
-
-@_once
-def _configure_gemini() -> bool:
-    k = os.getenv("GOOGLE_API_KEY")
-    if not k:
-        logging.warning("GOOGLE_API_KEY not set")
-        return False
-    try:
-        genai.configure(api_key=k)
-        return True
-    except Exception as e:
-        logging.error("Gemini configure: %s", e)
-        return False
+_INDEX = index.open_index()
+_SIMILAR = similar.SimilarityIndex()
+_GRAPH = graph.open_graph("graph", GRAPH_TTL)
+_SIMILAR_LOCK = threading.Lock()
+_similar_loaded = False
+if METRICS_FILE:
+    metrics.dump_periodically(METRICS_FILE)
+
+def configure_http(pool_size: int | None = None, connect_timeout: float | None = None, read_timeout: float | None = None):
+    t = services.TRANSPORT
+    t.configure(pool_size, (connect_timeout or t.timeout[0], read_timeout or t.timeout[1]))
+    aio_backend.reset_session()
+
+def transport_stats() -> dict:
+    out = services.TRANSPORT.stats()
+    for host, n in aio_backend.connections().items():
+        if host in out:
+            out[host]["connections"] += n
+    return out
+
+def configure_rate(service: str, rate: float, burst: int = 1):
+    services.configure_rate(service, rate, burst)
 
 def _s2_key() -> str | None:
     return os.getenv("SEMANTIC_API")
 
-def _gemini(prompt: str) -> str:
-    if not prompt.strip() or not _configure_gemini():
-        return ""
+def _send(service: str, method: str, url: str, **kw) -> requests.Response:
+    for attempt in range(services.RETRY_429 + 1):
+        cancel.check()
+        with services.slot(service):
+            cancel.check()
+            r = services.TRANSPORT.request(method, url, **kw)
+        if r.status_code != 429 or attempt == services.RETRY_429:
+            return r
+        services.backoff(service, r.headers)
+    return r
+
+def _http_get(service: str, endpoint: str, url: str, params: dict | None = None, headers: dict | None = None) -> str | None:
+    with metrics.span(f"http.{endpoint}") as sp:
+        ck, entry, body, hdrs = services.http_prepare(endpoint, url, params, headers)
+        if body is not None:
+            sp["cache"] = "hit"
+            return body
+        try:
+            r = _send(service, "GET", url, headers=hdrs, params=params)
+            if r.status_code != 304:
+                r.raise_for_status()
+        except requests.RequestException as e:
+            logging.error("%s %s: %s", service, endpoint, e)
+            sp["error"] = True
+            return entry["body"] if entry else None
+        sp["cache"] = "revalidated" if r.status_code == 304 else "miss"
+        sp["bytes"] = len(r.content)
+        return services.http_finish(ck, entry, r.status_code, r.headers, r.text)
+
+def _http_json(service: str, endpoint: str, url: str, params: dict | None = None, headers: dict | None = None):
+    return services.loads(service, endpoint, _http_get(service, endpoint, url, params, headers))
+
+def _http_post_json(service: str, endpoint: str, url: str, params: dict, payload, headers: dict | None = None):
+    with metrics.span(f"http.{endpoint}") as sp:
+        try:
+            r = _send(service, "POST", url, headers=headers, params=params, json=payload)
+            r.raise_for_status()
+            sp["bytes"] = len(r.content)
+            return r.json()
+        except (requests.RequestException, ValueError) as e:
+            logging.error("%s %s: %s", service, endpoint, e)
+            sp["error"] = True
+            return None
+
+def http_cache_stats() -> dict:
+    return services.HTTP_CACHE.stats() if services.HTTP_CACHE else {}
+
+def index_stats() -> dict:
+    out = {"papers": _INDEX.count()} if _INDEX else {}
+    out["similar"] = len(_SIMILAR)
+    if _GRAPH:
+        out["graph"] = _GRAPH.stats()
+    return out
+
+def _index_papers(papers: list[dict]):
+    if not papers:
+        return
+    if _INDEX:
+        try:
+            _INDEX.add(papers)
+        except Exception as e:
+            logging.error("Index: %s", e)
+    _SIMILAR.add(papers)
+
+def _similar() -> similar.SimilarityIndex:
+    global _similar_loaded
+    with _SIMILAR_LOCK:
+        if not _similar_loaded and _INDEX:
+            try:
+                _SIMILAR.add(_INDEX.records())
+            except Exception as e:
+                logging.error("Similar: %s", e)
+        _similar_loaded = True
+    return _SIMILAR
+
+@metrics.timed("related.local")
+def _local_related(text: str, pid: str | None, limit: int, skip: set) -> list[dict]:
+    if limit <= 0:
+        return []
     try:
-        rsp = genai.GenerativeModel(GEMINI_MODEL).generate_content(prompt)
-        return getattr(rsp, "text", None) or (rsp.parts[0].text if rsp.parts else "")
+        hits = _similar().similar(text, limit + len(skip), pid)
     except Exception as e:
-        logging.error("Gemini: %s", e)
-        return ""
+        logging.error("Similar: %s", e)
+        return []
+    return [h for h in hits if h["paperId"] not in skip][:limit]
+
+_PAGE_LOCK = threading.Lock()
+_PAGES: dict[str, frozenset] = {}
+
+def _note_page(pids: list[str]):
+    page = frozenset(pids)
+    with _PAGE_LOCK:
+        for pid in pids:
+            _PAGES.pop(pid, None)
+            _PAGES[pid] = page
+        while len(_PAGES) > PAGE_MEMO_MAX:
+            _PAGES.pop(next(iter(_PAGES)))
+
+def _page_of(pid: str | None) -> frozenset:
+    with _PAGE_LOCK:
+        return _PAGES.get(pid, frozenset())
 
-def gemini_essay(abs_: str) -> str:
-    p = "Analyze the following research‑paper abstract and write an extremely detailed analytical essay:\n---\n"+abs_+"\n---\nAnalytical Essay:"
-    return _gemini(p).strip()
+def _index_insights(pid: str, insights: str):
+    if _INDEX and insights:
+        try:
+            _INDEX.update(pid, insights=insights)
+        except Exception as e:
+            logging.error("Index: %s", e)
 
+def new_cursor(query: str, mode: str = "remote") -> dict:
+    if mode not in SEARCH_MODES:
+        raise ValueError(f"mode must be one of {SEARCH_MODES}")
+    remote = 0 if mode != "local" else None
+    return {"query": query, "mode": mode, "count": 0, "arxiv": remote, "s2": remote,
+            "local": 0 if mode != "remote" else None, "seen": [], "done": False}
+
+def _local_search(query: str, n: int, offset: int = 0) -> list[dict] | None:
+    if not _INDEX:
+        return []
+    try:
+        return _INDEX.search(query, n, offset)
+    except Exception as e:
+        logging.error("Index search: %s", e)
+        return None
+
+def _merge_hits(remote: list[dict], local: list[dict]) -> list[dict]:
+    seen, out = set(), []
+    for i in range(max(len(remote), len(local))):
+        for src in (remote, local):
+            if i < len(src) and src[i]["paperId"] not in seen:
+                seen.add(src[i]["paperId"])
+                out.append(src[i])
+    return out
+
+def _parse_feed(body: str | None):
+    return feedparser.parse(body) if body else None
+
+def _arxiv_feed(endpoint: str, params: dict):
+    return _parse_feed(_http_get("arxiv", endpoint, ARXIV_API, params, UA))
+
+def llm_cache_stats() -> dict:
+    return services.LLM_CACHE.stats() if services.LLM_CACHE else {}
+
+def _essay_prompt(abs_: str) -> str:
+    return "Analyze the following research‑paper abstract and write an extremely detailed analytical essay:\n---\n"+abs_+"\n---\nAnalytical Essay:"
+
+ID_TYPES = {"arxiv", "s2", "unknown"}
+ARXIV_ID_RE = re.compile(r"\d{4}\.\d{4,5}(v\d+)?|[a-z\-]+(\.[A-Z]{2})?/\d{7}(v\d+)?")
+
+def _hex(s: str) -> int:
+    try:
+        return int(s, 16) if len(s) == 4 else 0xFFFD
+    except ValueError:
+        return 0xFFFD
+
+class _EssayStream:
+    def __init__(self):
+        self.buf, self.pos, self.done = "", None, False
+        self.text = ""
+
+    def feed(self, chunk: str) -> str:
+        self.buf += chunk
+        if self.pos is None:
+            m = re.search(r'"essay"\s*:\s*"', self.buf)
+            if not m:
+                return ""
+            self.pos = m.end()
+        out, i, b = [], self.pos, self.buf
+        while i < len(b) and not self.done:
+            c = b[i]
+            if c == '"':
+                self.done = True
+            elif c != "\\":
+                out.append(c)
+            elif i + 1 >= len(b) or (b[i + 1] == "u" and i + 6 > len(b)):
+                break
+            elif b[i + 1] == "u":
+                cp = _hex(b[i + 2:i + 6])
+                if 0xD800 <= cp < 0xDC00:
+                    rest = b[i + 6:i + 12]
+                    if len(rest) < 6 and "\\u".startswith(rest[:2]):
+                        break
+                    low = _hex(rest[2:]) if rest.startswith("\\u") else 0
+                    if 0xDC00 <= low < 0xE000:
+                        cp = 0x10000 + ((cp - 0xD800) << 10) + (low - 0xDC00)
+                        i += 6
+                out.append(chr(cp) if cp < 0xD800 or cp >= 0xE000 else "\ufffd")
+                i += 5
+            else:
+                out.append({"n": "\n", "t": "\t", "r": "", "b": "", "f": ""}.get(b[i + 1], b[i + 1]))
+                i += 1
+            i += 1
+        self.pos = i
+        new = "".join(out)
+        self.text += new
+        return new
+
+    def forward(self, on_chunk):
+        if on_chunk is None:
+            return None
+        def _fwd(t: str):
+            new = self.feed(t)
+            if new:
+                on_chunk(new)
+        return _fwd
+
+def _valid_rel(r) -> bool:
+    if not isinstance(r, dict) or r.get("id_type") not in ID_TYPES:
+        return False
+    if not isinstance(r.get("title"), str) or not r["title"].strip() or not isinstance(r.get("id", ""), str):
+        return False
+    rid = (r.get("id") or "").strip().removeprefix("arXiv:").removeprefix("S2:")
+    if r["id_type"] == "arxiv":
+        return bool(ARXIV_ID_RE.fullmatch(rid))
+    return r["id_type"] == "unknown" or bool(rid)
+
+def _analysis_obj(data) -> dict | None:
+    if not isinstance(data, dict) or not isinstance(data.get("essay"), str) or not isinstance(data.get("related", []), list):
+        return None
+    return {"essay": data["essay"].strip(), "related": [r for r in data.get("related", []) if _valid_rel(r)]}
+
+def _parse_analysis(raw: str) -> dict | None:
+    return _analysis_obj(services.json_object(raw))
+
+def _analysis_prompt(abs_: str) -> str:
+    return ("Analyze the following research-paper abstract. Respond with one JSON object with exactly these keys, in this order: "
+            '"essay": an extremely detailed analytical essay about the paper (markdown allowed); '
+            f'"related": a list of {REL_LIMIT} closely related research papers, each {{"id_type": "arxiv" | "s2" | "unknown", "id": string, "title": string}}. '
+            'Use "arxiv" with the arXiv identifier or "s2" with the Semantic Scholar paperId only if you know it, otherwise "unknown" with an empty id.'
+            f"\n---\n{abs_}\n---")
+
+def _batch_prompt(papers: list[dict]) -> str:
+    return ("Analyze each of the following research-paper abstracts independently. Respond with one JSON object whose keys are the "
+            'paper ids exactly as given and whose values are objects with exactly these keys, in this order: '
+            '"essay": an extremely detailed analytical essay about that paper (markdown allowed); '
+            f'"related": a list of {REL_LIMIT} closely related research papers, each {{"id_type": "arxiv" | "s2" | "unknown", "id": string, "title": string}}. '
+            'Use "arxiv" with the arXiv identifier or "s2" with the Semantic Scholar paperId only if you know it, otherwise "unknown" with an empty id.'
+            + "".join(f"\n\nPaper id: {p['paperId']}\n---\n{p['abstract']}\n---" for p in papers))
+
+_DECODER = json.JSONDecoder()
+_WS = re.compile(r"\s*")
+
+def _object_prefix(raw: str) -> dict:
+    out, i = {}, raw.find("{") + 1
+    while 0 < i < len(raw):
+        try:
+            k, i = _DECODER.raw_decode(raw, _WS.match(raw, i).end())
+            i = _WS.match(raw, i).end()
+            if raw[i] != ":":
+                break
+            v, i = _DECODER.raw_decode(raw, _WS.match(raw, i + 1).end())
+        except (ValueError, IndexError):
+            break
+        if isinstance(k, str):
+            out[k] = v
+        i = _WS.match(raw, i).end()
+        if raw[i:i + 1] != ",":
+            break
+        i += 1
+    return out
+
+def _parse_batch(raw: str, papers: list[dict]) -> dict[str, dict]:
+    data = services.json_object(raw) if raw else None
+    if data is None:
+        data = _object_prefix(raw) if raw else {}
+        if raw:
+            logging.warning("Gemini batch: malformed or truncated JSON, kept %d of %d answers", len(data), len(papers))
+        if not data:
+            return {}
+    out = {}
+    for p in papers:
+        res = _analysis_obj(data.get(p["paperId"]))
+        if res and res["essay"]:
+            out[p["paperId"]] = res
+            services.store(services.gemini_key(_analysis_prompt(p["abstract"]), True), json.dumps(res))
+    return out
+
+def _pack_batches(papers: list[dict], sizes: list[int], overhead: int, budget: int) -> list[list[dict]]:
+    batches, cur, used = [], [], overhead
+    for p, n in zip(papers, sizes):
+        full = len(cur) >= ESSAY_BATCH_MAX or (len(cur) + 1) * ESSAY_OUTPUT_TOKENS > services.GEMINI_OUTPUT_TOKENS
+        if cur and (used + n > budget or full):
+            batches.append(cur)
+            cur, used = [], overhead
+        cur.append(p)
+        used += n
+    if cur:
+        batches.append(cur)
+    return batches
+
+def _analysis_from(raw: str, stream: _EssayStream) -> dict:
+    parsed = _parse_analysis(raw) if raw else None
+    if parsed is not None:
+        return parsed
+    if raw:
+        logging.warning("Gemini analysis: malformed JSON, falling back")
+    return {"essay": stream.text.strip() or (_EssayStream().feed(raw).strip() if raw else ""), "related": None}
+
+def _typed_related(entries: list[dict]) -> list:
+    out = []
+    for r in entries:
+        rid, title = (r.get("id") or "").strip(), r["title"].strip()
+        if r["id_type"] == "arxiv":
+            out.append({"paperId": f"arXiv:{rid.removeprefix('arXiv:')}", "title": title, "source": "arXiv"})
+        elif r["id_type"] == "s2":
+            out.append({"paperId": f"S2:{rid.removeprefix('S2:')}", "title": title, "source": "Semantic Scholar"})
+        else:
+            out.append(title)
+    return out
+
+def _finish_related(parsed: list) -> list[dict]:
+    unknown = [p for p in parsed if isinstance(p, str)]
+    resolved = dict(zip(unknown, _resolve_titles(unknown)))
+    out = [resolved[p] if isinstance(p, str) else p for p in parsed]
+    return [p for p in out if p][:REL_LIMIT]
+
+@metrics.timed("related.gemini")
 def gemini_related(abs_: str) -> list[dict]:
+    ck = cache.key(services.GEMINI_MODEL, "related", abs_)
+    hit = services.cached(ck)
+    if hit is not None:
+        return json.loads(hit)
+    rel = aio_backend.run(aio_backend.gemini_analysis(abs_, essay_fallback=False), cancel.current())["related"]
+    out = _finish_related(_typed_related(rel)) if rel is not None else _gemini_related_lines(abs_)
+    if out:
+        services.store(ck, json.dumps(out))
+    return out
+
+def _gemini_related_lines(abs_: str) -> list[dict]:
     prompt = f"List {REL_LIMIT} research papers closely related to the following abstract. Output each on a new line as <ID>::<Title>. If you know the arXiv ID start with arXiv:ID, if you know the Semantic Scholar paperId start with S2:ID, otherwise write Unknown::Title.\n---\n{abs_}\n---\nLines:"
-    raw = _gemini(prompt)
-    print(raw)
+    raw = aio_backend.run(aio_backend.generate(prompt), cancel.current())
+    logging.debug("Gemini related lines: %r", raw)
     lines = [l.strip() for l in raw.splitlines() if l.strip()]
-    out = []
+    parsed = []
     for line in lines:
         if "::" not in line:
             continue
         pid, title = map(str.strip, line.split("::", 1))
-        source = "Unknown"
         if pid.startswith("arXiv:") or re.fullmatch(r"\d{4}\.\d{4,5}(v\d+)?", pid):
             pid = pid.replace("arXiv:", "")
-            source = "arXiv"
-            out.append({"paperId": f"arXiv:{pid}", "title": title, "source": source})
+            parsed.append({"paperId": f"arXiv:{pid}", "title": title, "source": "arXiv"})
         elif pid.startswith("S2:"):
-            source = "Semantic Scholar"
-            out.append({"paperId": pid, "title": title, "source": source})
+            parsed.append({"paperId": pid, "title": title, "source": "Semantic Scholar"})
         else:
-            title_only = f"{pid} {title}".strip()
-            entry = _lookup_title(title_only)
-            if entry:
-                out.append(entry)
-        if len(out) == REL_LIMIT:
-            break
-    return out
+            parsed.append(title if pid.lower() == "unknown" else f"{pid} {title}".strip())
+    return _finish_related(parsed)
 
 def _keywords(text: str) -> list[str]:
     stop = {"the","and","of","to","in","a","for","on","with","an","by",
@@ -89,12 +420,12 @@ def _keywords(text: str) -> list[str]:
             if w not in stop and len(w) > 2][:10]
 
 
+@metrics.timed("related.fallback_arxiv")
 def _fallback_arxiv(text: str, limit: int) -> list[dict]:
     words = _keywords(text)
     if not words:
         return []
-    q = urllib.parse.urlencode({"search_query": "all:" + "+AND+".join(words), "start": 0, "max_results": limit})
-    feed = feedparser.parse(f"{ARXIV_API}?{q}", request_headers=UA)
+    feed = _arxiv_feed("arxiv_search", {"search_query": "all:" + "+AND+".join(words), "start": 0, "max_results": limit})
     res = []
     for e in getattr(feed, "entries", [])[:limit]:
         raw_id = e.id.split("/")[-1]
@@ -103,6 +434,7 @@ def _fallback_arxiv(text: str, limit: int) -> list[dict]:
         res.append({"paperId": f"arXiv:{pid}", "title": e.title.strip().replace("\n", " "), "source": "arXiv"})
     return res
 
+@metrics.timed("related.fallback_s2")
 def _fallback_s2(text: str, limit: int) -> list[dict]:
     key = _s2_key()
     if not key:
@@ -117,24 +449,70 @@ def _fallback_s2(text: str, limit: int) -> list[dict]:
         out.append({"paperId": f"S2:{r['paperId']}", "title": r["title"].strip(), "source": "Semantic Scholar"})
     return out
 
+def _norm_title(title: str) -> str:
+    return " ".join(re.sub(r"[^\w\s]", " ", title.lower()).split())
+
+_TITLE_POOL = ThreadPoolExecutor(max_workers=TITLE_WORKERS, thread_name_prefix="title")
+_TITLE_LOCK = threading.RLock()
+_TITLES: dict[str, Future] = {}
+
+def _title_done(k: str, f: Future):
+    if not f.cancelled() and f.exception() is not None:
+        with _TITLE_LOCK:
+            if _TITLES.get(k) is f:
+                del _TITLES[k]
+
+def _resolve_titles(titles: list[str]) -> list[dict | None]:
+    token, futs = cancel.current(), []
+    with _TITLE_LOCK:
+        for t in titles:
+            k = _norm_title(t)
+            f = _TITLES.get(k)
+            if f is None:
+                f = _TITLES[k] = _TITLE_POOL.submit(_scoped, token, _lookup_title, t)
+                f.add_done_callback(lambda f, k=k: _title_done(k, f))
+            futs.append(f)
+        while len(_TITLES) > TITLE_MEMO_MAX:
+            _TITLES.pop(next(iter(_TITLES)))
+    out = []
+    for t, f in zip(titles, futs):
+        try:
+            try:
+                out.append(f.result())
+            except cancel.Cancelled:
+                cancel.check()
+                out.append(_lookup_title(t))
+        except Exception as e:
+            logging.error("Title lookup: %s", e)
+            out.append(None)
+    return out
+
+@metrics.timed("related.lookup_title")
 def _lookup_title(title: str) -> dict | None:
-    key = _s2_key()
+    key, failed = _s2_key(), False
     if key:
-        res = _s2_search(title, 1, key)
+        url, params, headers = _s2_search_args(title, 1, key)
+        data = _http_json("s2", "s2_search", url, params, headers)
+        res = _s2_rows(data)
         if res:
             r = res[0]
             return {"paperId": f"S2:{r['paperId']}", "title": r["title"].strip(), "source": "Semantic Scholar"}
-    rid = _find_arxiv_id_by_title(title)
+        failed = data is None
+    feed = _arxiv_title_feed(title)
+    rid = _arxiv_id_from(feed)
     if rid:
         return {"paperId": f"arXiv:{rid}", "title": title, "source": "arXiv"}
+    if failed or (title and feed is None):
+        raise LookupError(f"title lookup failed for {title!r}")
     return None
 
-def _find_arxiv_id_by_title(title: str) -> str | None:
+def _arxiv_title_feed(title: str):
     if not title:
         return None
     safe = title.replace('"', '')
-    q = urllib.parse.urlencode({"search_query": f'ti:"{safe}"', "start": 0, "max_results": 1})
-    feed = feedparser.parse(f"{ARXIV_API}?{q}", request_headers=UA)
+    return _arxiv_feed("arxiv_search", {"search_query": f'ti:"{safe}"', "start": 0, "max_results": 1})
+
+def _arxiv_id_from(feed) -> str | None:
     if getattr(feed, "entries", []):
         rid = feed.entries[0].id.split("/")[-1]
         m = re.match(r"(\d{4}\.\d{4,5}(v\d+)?)", rid)
@@ -144,19 +522,63 @@ def _find_arxiv_id_by_title(title: str) -> str | None:
 def _clean_html(txt: str) -> str:
     return html.unescape(re.sub(r"<.*?>", "", txt or "")).strip()
 
-def _safe_related(abs_: str, title: str) -> list[dict]:
-    rel = gemini_related(abs_)
-    if not rel:
-        rel = _fallback_s2(abs_, REL_LIMIT)
-    if len(rel) < REL_LIMIT:
-        rel += _fallback_arxiv(abs_, REL_LIMIT - len(rel))
-    if len(rel) < REL_LIMIT:
-        rel += _fallback_s2(title, REL_LIMIT - len(rel))
-    if len(rel) < REL_LIMIT:
-        rel += _fallback_arxiv(title, REL_LIMIT - len(rel))
-    if not rel:
-        rel = [{"paperId": "N/A", "title": "No related papers found", "source": "N/A"}]
-    return rel[:REL_LIMIT]
+_CASCADE_POOL = ThreadPoolExecutor(max_workers=CASCADE_WORKERS, thread_name_prefix="cascade")
+
+def _scoped(token: cancel.CancelToken, fn, *a):
+    with cancel.scope(token):
+        cancel.check()
+        return fn(*a)
+
+def _merge_related(results: list, pid: str | None) -> list[dict]:
+    seen, out = {pid, "N/A"}, []
+    for rel in results:
+        for r in rel or ():
+            if r.get("paperId") not in seen:
+                seen.add(r["paperId"])
+                out.append(r)
+    return out
+
+@metrics.timed("stage.related")
+def _safe_related(abs_: str, title: str, pid: str | None = None) -> list[dict]:
+    steps = [(_graph_related, pid, REL_LIMIT), (gemini_related, abs_), None, (_fallback_s2, abs_, REL_LIMIT),
+             (_fallback_arxiv, abs_, REL_LIMIT), (_fallback_s2, title, REL_LIMIT), (_fallback_arxiv, title, REL_LIMIT)]
+    hedge_at = [0, 0, 1, 1, 2, 3, 4]
+    results = [None] * len(steps)
+    results[2] = _local_related(f"{title} {abs_}", pid, REL_LIMIT, _page_of(pid))
+    parent, plan = cancel.current(), cancel.CancelToken()
+    unhook = parent.on_cancel(plan.cancel) if parent else None
+    running, start, launched = {}, time.monotonic(), 0
+    try:
+        while True:
+            cancel.check()
+            remote = any(r for i, r in enumerate(results) if i != 2)
+            if len(_merge_related(results, pid)) >= REL_LIMIT and (results[1] is not None or remote):
+                break
+            if launched == len(steps) and not running:
+                break
+            due = start + HEDGE_DELAY_S * hedge_at[min(launched, len(steps) - 1)]
+            if launched < len(steps) and (not running or time.monotonic() >= due):
+                if steps[launched]:
+                    running[_CASCADE_POOL.submit(_scoped, plan, *steps[launched])] = launched
+                launched += 1
+                continue
+            done, _ = wait(list(running), timeout=max(0.0, due - time.monotonic()) if launched < len(steps) else None,
+                           return_when=FIRST_COMPLETED)
+            for f in done:
+                i = running.pop(f)
+                try:
+                    results[i] = f.result()
+                except cancel.Cancelled:
+                    results[i] = []
+                except Exception as e:
+                    logging.error("Related step %s: %s", steps[i][0].__name__, e)
+                    results[i] = []
+    finally:
+        plan.cancel()
+        if unhook:
+            unhook()
+    rel = _merge_related(results, pid)
+    return rel[:REL_LIMIT] or [{"paperId": "N/A", "title": "No related papers found", "source": "N/A"}]
 
 
 def _mk_arxiv(e) -> dict | None:
@@ -180,7 +602,6 @@ def _mk_arxiv(e) -> dict | None:
         "insights": "",
         "source": "arXiv"
     }
-    paper["references"] = _safe_related(paper["abstract"], paper["title"])
     return paper
 
 def _mk_s2(entry: dict) -> dict | None:
@@ -201,94 +622,440 @@ def _mk_s2(entry: dict) -> dict | None:
         "insights": "",
         "source": "Semantic Scholar"
     }
-    paper["references"] = _safe_related(paper["abstract"], paper["title"])
     return paper
 
+def _bare_arxiv_id(rid: str) -> str:
+    return re.sub(r"v\d+$", "", rid.split("/abs/")[-1].removeprefix("arXiv:")).lower()
+
+def _arxiv_keys(e) -> set[str]:
+    keys = {"arxiv:" + _bare_arxiv_id(getattr(e, "id", "")), "title:" + cache.key(_norm_title(getattr(e, "title", "")))}
+    if getattr(e, "arxiv_doi", None):
+        keys.add("doi:" + e.arxiv_doi.lower())
+    return keys
+
+def _s2_keys(d: dict) -> set[str]:
+    ext = d.get("externalIds") or {}
+    keys = {"title:" + cache.key(_norm_title(d.get("title") or ""))}
+    if ext.get("ArXiv"):
+        keys.add("arxiv:" + _bare_arxiv_id(ext["ArXiv"]))
+    if ext.get("DOI"):
+        keys.add("doi:" + ext["DOI"].lower())
+    return keys
+
+def _paper_keys(p: dict) -> set[str]:
+    keys = {"title:" + cache.key(_norm_title(p.get("title") or ""))}
+    if p["paperId"].startswith("arXiv:"):
+        keys.add("arxiv:" + _bare_arxiv_id(p["paperId"]))
+    return keys
+
+def _dedup(arxiv_entries: list, s2_entries: list[dict], seen: set | None = None) -> list[tuple]:
+    groups, owner = [], dict.fromkeys(seen or (), -1)
+    for e in arxiv_entries:
+        keys = _arxiv_keys(e)
+        if not any(k in owner for k in keys):
+            groups.append([e, None])
+            owner.update(dict.fromkeys(keys, len(groups) - 1))
+    for d in s2_entries:
+        keys = _s2_keys(d)
+        hit = next((owner[k] for k in keys if k in owner), None)
+        if hit is None:
+            groups.append([None, d])
+            hit = len(groups) - 1
+        elif hit >= 0 and groups[hit][1] is None:
+            groups[hit][1] = d
+        owner.update(dict.fromkeys(keys, hit))
+    if seen is not None:
+        seen.update(owner)
+    return [tuple(g) for g in groups]
+
+def _mk_merged(e, d: dict | None) -> dict | None:
+    a = _mk_arxiv(e) if e is not None else None
+    s = _mk_s2(d) if d is not None else None
+    if not a or not s:
+        return a or s
+    a.update({"citationCount": s["citationCount"], "influentialCitationCount": s["influentialCitationCount"],
+              "s2PaperId": s["paperId"], "source": "arXiv + Semantic Scholar"})
+    if s["venue"] != "Semantic Scholar":
+        a["s2Venue"] = s["venue"]
+    return a
+
+def _s2_search_args(query: str, limit: int, key: str, offset: int = 0) -> tuple[str, dict, dict]:
+    params = {"query": query, "offset": offset, "limit": min(limit, MAX_PER_QUERY_S2), "fields": S2_FIELDS}
+    return f"{S2_API}/paper/search", params, {"x-api-key": key, **UA}
+
+def _s2_rows(data) -> list[dict]:
+    return [d for d in (data or {}).get("data", []) if d.get("paperId") and d.get("title")]
+
 def _s2_search(query: str, limit: int, key: str) -> list[dict]:
-    headers = {"x-api-key": key, **UA}
-    params = {"query": query, "limit": min(limit, MAX_PER_QUERY_S2), "fields": "paperId,url,title,abstract,authors,year,venue,citationCount,influentialCitationCount"}
-    try:
-        r = requests.get(f"{S2_API}/paper/search", headers=headers, params=params, timeout=20)
-        r.raise_for_status()
-        return [d for d in r.json().get("data", []) if d.get("paperId") and d.get("title")]
-    except requests.RequestException as e:
-        logging.error("S2 search: %s", e)
-        return []
+    url, params, headers = _s2_search_args(query, limit, key)
+    return _s2_rows(_http_json("s2", "s2_search", url, params, headers))
 
-def _s2_details(pid: str, key: str) -> dict | None:
-    headers = {"x-api-key": key, **UA}
-    fields = "paperId,url,title,abstract,authors,year,venue,citationCount,influentialCitationCount"
+def _s2_batch(ids: list[str], key: str) -> dict[str, dict]:
+    out = {}
+    for i in range(0, len(ids), S2_BATCH_MAX):
+        chunk = ids[i:i + S2_BATCH_MAX]
+        data = _http_post_json("s2", "s2_batch", f"{S2_API}/paper/batch", {"fields": S2_FIELDS}, {"ids": chunk}, {"x-api-key": key, **UA})
+        for pid, d in zip(chunk, data or []):
+            if d and d.get("paperId"):
+                out[pid] = d
+                services.http_remember(f"{S2_API}/paper/{pid}", {"fields": S2_FIELDS}, json.dumps(d))
+    return out
+
+def _s2_ref(pid: str) -> str | None:
+    if pid.startswith("S2:"):
+        return pid[3:]
+    if pid.startswith("arXiv:"):
+        return "ARXIV:" + _bare_arxiv_id(pid)
+    return None
+
+def ensure_edges(pids: list[str]) -> int:
+    key = _s2_key()
+    if not _GRAPH or not key:
+        return 0
+    pids = [p for p in dict.fromkeys(pids) if p and _s2_ref(p)]
+    known = _GRAPH.fetched(pids)
+    todo = [p for p in pids if p not in known]
+    for i in range(0, len(todo), EDGE_BATCH_MAX):
+        chunk = todo[i:i + EDGE_BATCH_MAX]
+        data = _http_post_json("s2", "s2_edges", f"{S2_API}/paper/batch", {"fields": EDGE_FIELDS},
+                               {"ids": [_s2_ref(p) for p in chunk]}, {"x-api-key": key, **UA})
+        for pid, d in zip(chunk, data or []):
+            try:
+                _GRAPH.add(pid, d)
+            except Exception as e:
+                logging.error("Graph %s: %s", pid, e)
+    return len(todo)
+
+def _edge_job(pids: list[str]):
+    while _user_busy():
+        time.sleep(PREFETCH_IDLE_POLL_S)
     try:
-        r = requests.get(f"{S2_API}/paper/{pid}", headers=headers, params={"fields": fields}, timeout=20)
-        r.raise_for_status()
-        return _mk_s2(r.json())
-    except requests.RequestException as e:
-        logging.error("S2 details: %s", e)
-        return None
+        ensure_edges(pids)
+    except Exception as e:
+        logging.error("Edge prefetch: %s", e)
 
-def _arxiv_search(query: str, limit: int):
-    if limit <= 0:
+def citation_edges(pid: str, fetch: bool = True) -> dict:
+    if fetch:
+        ensure_edges([pid])
+    if not _GRAPH:
+        return {"references": [], "citations": []}
+    return {"references": _GRAPH.references(pid), "citations": _GRAPH.citations(pid)}
+
+def citing_all(pids: list[str], limit: int = 100) -> list[dict]:
+    ensure_edges(pids)
+    return _GRAPH.citing_all(pids, limit) if _GRAPH else []
+
+@metrics.timed("stage.graph_related")
+def _graph_related(pid: str | None, limit: int) -> list[dict]:
+    if not pid or not _GRAPH:
         return []
-    p = urllib.parse.urlencode({"search_query": f"all:{query}", "start": 0, "max_results": min(limit, MAX_PER_QUERY_ARXIV), "sortBy": "relevance", "sortOrder": "descending"})
-    feed = feedparser.parse(f"{ARXIV_API}?{p}", request_headers=UA)
-    return getattr(feed, "entries", [])[:limit]
+    ensure_edges([pid])
+    return _GRAPH.related(pid, limit)
 
-def search_papers_backend(query: str, n: int, q: Queue):
-    q.put(("status", f"Searching “{query}”…"))
-    key = _s2_key()
-    want_s2 = n // 2 if key else 0
-    s2_results = _s2_search(query, want_s2, key) if want_s2 else []
-    need_arxiv = n - len(s2_results)
-    arxiv_results = _arxiv_search(query, need_arxiv)
-    total = len(s2_results) + len(arxiv_results)
-    if not total:
-        q.put(("status", "No papers found"))
-        q.put(("papers", []))
-        q.put(None)
-        return
-    papers = []
-    done = 0
-    for e in arxiv_results:
-        done += 1
-        q.put(("status", f"Processing {done}/{total} (arXiv)"))
-        p = _mk_arxiv(e)
-        if p:
-            p["insights"] = gemini_essay(p["abstract"]) if p["abstract"] else ""
-            papers.append(p)
-        time.sleep(DELAY_S)
-    for e in s2_results:
-        done += 1
-        q.put(("status", f"Processing {done}/{total} (Semantic)"))
-        p = _mk_s2(e)
-        if p:
-            p["insights"] = gemini_essay(p["abstract"]) if p["abstract"] else ""
-            papers.append(p)
-        time.sleep(DELAY_S)
-    q.put(("papers", papers))
-    q.put(("status", f"Analysis complete ({len(papers)} papers)"))
-    q.put(None)
+class _S2Batcher:
+    def __init__(self, window: float, max_size: int):
+        self.window, self.max_size = window, max_size
+        self._lock = threading.Lock()
+        self._pending: dict[str, Future] = {}
+        self._inflight: dict[str, Future] = {}
+        self._timer = None
+
+    def submit(self, pid: str, key: str) -> Future:
+        with self._lock:
+            f = self._pending.get(pid) or self._inflight.get(pid)
+            if f:
+                return f
+            f = self._pending[pid] = Future()
+            if len(self._pending) >= self.max_size:
+                threading.Thread(target=self._flush, args=(key,), daemon=True, name="s2-batch").start()
+            elif self._timer is None:
+                self._timer = threading.Timer(self.window, self._flush, (key,))
+                self._timer.daemon = True
+                self._timer.start()
+        return f
+
+    def _flush(self, key: str):
+        with self._lock:
+            batch, self._pending = self._pending, {}
+            if self._timer:
+                self._timer.cancel()
+                self._timer = None
+            self._inflight.update(batch)
+        if not batch:
+            return
+        res = {}
+        try:
+            res = {pid: d for pid in batch if (d := _s2_fresh(pid))}
+            res.update(_s2_batch([pid for pid in batch if pid not in res], key))
+        except Exception as e:
+            logging.error("S2 batch: %s", e)
+        with self._lock:
+            for pid in batch:
+                self._inflight.pop(pid, None)
+        for pid, f in batch.items():
+            if not f.cancelled():
+                f.set_result(res.get(pid))
+
+_S2_BATCHER = _S2Batcher(S2_BATCH_WINDOW_S, S2_BATCH_MAX)
+
+def _s2_fresh(pid: str) -> dict | None:
+    hit = services.http_fresh("s2_paper", f"{S2_API}/paper/{pid}", {"fields": S2_FIELDS})
+    return json.loads(hit) if hit else None
+
+def _arxiv_search_params(query: str, limit: int, start: int = 0) -> dict:
+    return {"search_query": f"all:{query}", "start": start, "max_results": min(limit, MAX_PER_QUERY_ARXIV), "sortBy": "relevance", "sortOrder": "descending"}
+
+def _related(p: dict) -> list[dict]:
+    return _safe_related(p["abstract"], p["title"], p["paperId"])
 
-def fetch_paper_details_backend(pid: str, q: Queue):
-    if not pid:
-        q.put(("paper_details_error", "Invalid ID"))
+_REL_POOL = ThreadPoolExecutor(max_workers=RELATED_WORKERS, thread_name_prefix="related")
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+_EDGE_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="edges")
+_REL_LOCK = threading.Lock()
+_RELATED: dict[str, Future] = {}
+
+def _related_job(p: dict, token: cancel.CancelToken | None) -> list[dict]:
+    with cancel.scope(token):
+        cancel.check()
+        return _related(p)
+
+def _related_future(p: dict, prefetch: bool, token: cancel.CancelToken | None = None) -> Future:
+    pid = p["paperId"]
+    with _REL_LOCK:
+        f = _RELATED.get(pid)
+        if f and not f.cancelled() and not (f.done() and f.exception()):
+            if prefetch or not f.cancel():
+                return f
+        f = _RELATED[pid] = (_PREFETCH_POOL if prefetch else _REL_POOL).submit(_related_job, dict(p), token)
+        while len(_RELATED) > RELATED_MEMO_MAX:
+            _RELATED.pop(next(iter(_RELATED)))
+    if token:
+        token.on_cancel(f.cancel)
+    return f
+
+def request_related(paper: dict, q: Queue, prefetch: bool = False, token: cancel.CancelToken | None = None):
+    pid = paper.get("paperId")
+    if not pid or (token and token.cancelled):
         return
-    q.put(("status", f"Fetching {pid}…"))
-    out = None
-    if pid.startswith("arXiv:"):
-        qs = urllib.parse.urlencode({"id_list": pid[6:], "max_results": 1})
-        feed = feedparser.parse(f"{ARXIV_API}?{qs}", request_headers=UA)
-        if getattr(feed, "entries", []):
-            out = _mk_arxiv(feed.entries[0])
-    elif pid.startswith("S2:"):
-        key = _s2_key()
-        if not key:
-            q.put(("paper_details_error", "SEMANTIC_API missing"))
+    def _done(f: Future):
+        if token and token.cancelled:
+            return
+        if f.cancelled() or isinstance(f.exception(), cancel.Cancelled):
+            if not prefetch:
+                request_related(paper, q, prefetch, token)
             return
-        out = _s2_details(pid[3:], key)
-    if out and out.get("abstract"):
-        out["insights"] = gemini_essay(out["abstract"])
+        try:
+            refs = f.result()
+        except Exception as e:
+            logging.error("Related %s: %s", pid, e)
+            refs = []
+        q.put(("related", (pid, refs)))
+    _related_future(paper, prefetch, token).add_done_callback(_done)
+
+def _emitter(q: Queue, token: cancel.CancelToken | None):
+    return q.put if token is None else lambda msg: token.cancelled or q.put(msg)
+
+_SEARCH_LOCK = threading.Lock()
+_active_searches = 0
+
+def _search_active(delta: int):
+    global _active_searches
+    with _SEARCH_LOCK:
+        _active_searches += delta
+
+def search_papers_backend(query: str, n: int, q: Queue, mode: str = "remote", cursor: dict | None = None,
+                          token: cancel.CancelToken | None = None):
+    cursor = cursor or new_cursor(query, mode)
+    _search_active(1)
+    try:
+        res = aio_backend.run(aio_backend.search_papers_async(query, n, _emitter(q, token), mode, cursor), token)
+        q.put(("cursor", cursor))
+        _EDGE_POOL.submit(_edge_job, [p["paperId"] for p in res])
+    except cancel.Cancelled:
+        logging.info("Search %r cancelled", query)
+    finally:
+        _search_active(-1)
+    q.put(None)
+
+class _DetailFlight:
+    def __init__(self, pid: str, prefetch: bool = False):
+        self.pid = pid
+        self.prefetch = prefetch
+        self.claimed = False
+        self.token = cancel.CancelToken()
+        self.lock = threading.Lock()
+        self.log: list = []
+        self.subs: list = []
+        self.future: Future | None = None
+
+    def emit(self, msg):
+        with self.lock:
+            self.log.append(msg)
+            for q, token in self.subs:
+                if not (token and token.cancelled):
+                    q.put(msg)
+
+    def join(self, q: Queue, token: cancel.CancelToken | None) -> bool:
+        with self.lock:
+            if self.token.cancelled:
+                return False
+            for msg in self.log:
+                q.put(msg)
+            self.subs.append((q, token))
+        if token:
+            token.on_cancel(lambda: self.leave(q, token))
+        return True
+
+    def leave(self, q: Queue, token: cancel.CancelToken | None):
+        with self.lock:
+            self.subs = [s for s in self.subs if s != (q, token)]
+            idle = not self.subs
+        if idle:
+            self.token.cancel()
+            if self.future:
+                self.future.cancel()
+
+_DETAIL_POOL = ThreadPoolExecutor(max_workers=DETAIL_WORKERS, thread_name_prefix="details")
+_DETAIL_PREFETCH_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="detail-prefetch")
+_PREFETCH_BUDGET = ratelimit.TokenBucket(PREFETCH_PER_MIN / 60, PREFETCH_PER_MIN)
+_DETAIL_LOCK = threading.Lock()
+_DETAILS: dict[str, _DetailFlight] = {}
+_DETAIL_CACHE: dict[str, dict] = {}
+_PREFETCH_QUEUED: set[str] = set()
+_PREFETCH_STATS = dict.fromkeys(("requests", "hits", "misses", "queued", "prefetched", "used", "joined", "over_budget", "dropped", "evicted_unused"), 0)
+
+def configure_prefetch(per_minute: float):
+    _PREFETCH_BUDGET.configure(per_minute / 60, max(1, int(per_minute)))
+
+def prefetch_stats() -> dict:
+    with _DETAIL_LOCK:
+        st = dict(_PREFETCH_STATS)
+    st["hit_rate"] = st["hits"] / st["requests"] if st["requests"] else 0.0
+    st["used_rate"] = (st["used"] + st["joined"]) / st["prefetched"] if st["prefetched"] else 0.0
+    return st
+
+def _remember_details(out: dict, flight: _DetailFlight):
+    with _DETAIL_LOCK:
+        _DETAIL_CACHE.pop(flight.pid, None)
+        _DETAIL_CACHE[flight.pid] = {"details": out, "prefetched": flight.prefetch and not flight.claimed, "used": False}
+        while len(_DETAIL_CACHE) > DETAIL_CACHE_MAX:
+            old = _DETAIL_CACHE.pop(next(iter(_DETAIL_CACHE)))
+            _PREFETCH_STATS["evicted_unused"] += old["prefetched"] and not old["used"]
+
+def _details_job(flight: _DetailFlight) -> dict | None:
+    try:
+        out = aio_backend.run(aio_backend.fetch_paper_details_async(flight.pid, flight.emit), flight.token)
+        if out:
+            _remember_details(out, flight)
+        return out
+    except cancel.Cancelled:
+        logging.info("Details %s cancelled", flight.pid)
+        return None
+    except Exception as e:
+        logging.error("Details %s: %s", flight.pid, e)
+        flight.emit(("paper_details_error", (flight.pid, str(e))))
+        return None
+    finally:
+        with _DETAIL_LOCK:
+            if _DETAILS.get(flight.pid) is flight:
+                del _DETAILS[flight.pid]
+
+def _cached_details(pid: str) -> dict | None:
+    with _DETAIL_LOCK:
+        _PREFETCH_STATS["requests"] += 1
+        ent = _DETAIL_CACHE.pop(pid, None)
+        if ent is None:
+            _PREFETCH_STATS["misses"] += 1
+            return None
+        _DETAIL_CACHE[pid] = ent
+        _PREFETCH_STATS["hits"] += 1
+        _PREFETCH_STATS["used"] += ent["prefetched"] and not ent["used"]
+        ent["used"] = True
+        return ent["details"]
+
+def request_details(pid: str, q: Queue, token: cancel.CancelToken | None = None) -> Future | None:
+    if token and token.cancelled:
+        return None
+    out = _cached_details(pid)
     if out:
-        q.put(("paper_details", out))
-        q.put(("status", f"Details ready for {pid}"))
-    else:
-        q.put(("paper_details_error", f"Details not found for {pid}"))
+        q.put(("paper_details", (pid, {**out, "insights": ""})))
+        q.put(("essay_done", (pid, out["insights"])))
+        f = Future()
+        f.set_result(dict(out))
+        return f
+    with _DETAIL_LOCK:
+        flight = _DETAILS.get(pid)
+        if flight is None or not flight.join(q, token):
+            flight = _DETAILS[pid] = _DetailFlight(pid)
+            flight.join(q, token)
+            flight.future = _DETAIL_POOL.submit(_details_job, flight)
+        elif flight.prefetch and not flight.claimed:
+            flight.claimed = True
+            _PREFETCH_STATS["joined"] += 1
+    return flight.future
+
+def _user_busy() -> bool:
+    if _active_searches:
+        return True
+    with _DETAIL_LOCK:
+        return any(not f.prefetch or f.claimed for f in _DETAILS.values())
+
+def _prefetch_job(pid: str, token: cancel.CancelToken | None):
+    try:
+        while _user_busy():
+            if token and token.cancelled:
+                return
+            time.sleep(PREFETCH_IDLE_POLL_S)
+        if token and token.cancelled:
+            return
+        with _DETAIL_LOCK:
+            if pid in _DETAIL_CACHE or pid in _DETAILS:
+                return
+            if not _PREFETCH_BUDGET.try_acquire():
+                _PREFETCH_STATS["over_budget"] += 1
+                return
+            flight = _DETAILS[pid] = _DetailFlight(pid, prefetch=True)
+            flight.future = Future()
+            flight.future.set_running_or_notify_cancel()
+        unhook = token.on_cancel(lambda: flight.claimed or flight.token.cancel()) if token else None
+        out = None
+        try:
+            with metrics.span("stage.prefetch"):
+                out = _details_job(flight)
+        finally:
+            if unhook:
+                unhook()
+            flight.future.set_result(out)
+        if out:
+            with _DETAIL_LOCK:
+                _PREFETCH_STATS["prefetched"] += 1
+    finally:
+        with _DETAIL_LOCK:
+            _PREFETCH_QUEUED.discard(pid)
+
+def prefetch_details(pids: list[str], token: cancel.CancelToken | None = None):
+    key, s2 = _s2_key(), []
+    for pid in pids:
+        if not pid or not pid.startswith(("arXiv:", "S2:")):
+            continue
+        with _DETAIL_LOCK:
+            if pid in _DETAIL_CACHE or pid in _DETAILS or pid in _PREFETCH_QUEUED:
+                continue
+            if len(_PREFETCH_QUEUED) >= PREFETCH_QUEUE_MAX:
+                _PREFETCH_STATS["dropped"] += 1
+                continue
+            _PREFETCH_QUEUED.add(pid)
+            _PREFETCH_STATS["queued"] += 1
+        _DETAIL_PREFETCH_POOL.submit(_prefetch_job, pid, token)
+        if pid.startswith("S2:"):
+            s2.append(pid[3:])
+    if key and len(s2) > 1:
+        for sid in s2:
+            _S2_BATCHER.submit(sid, key)
+
+def fetch_paper_details_backend(pid: str, q: Queue, token: cancel.CancelToken | None = None) -> dict | None:
+    f = request_details(pid, q, token)
+    try:
+        return f.result() if f else None
+    except CancelledError:
+        return None
@@ -0,0 +1,304 @@
+from __future__ import annotations
+import os, sys, json, time, random, asyncio, argparse, tempfile, threading, tracemalloc, subprocess, urllib.parse
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from queue import Queue, Empty
+
+RESULTS_DIR = "bench_results"
+WORDS = ("graph neural network attention transformer convolution segmentation language model reinforcement "
+         "policy control diffusion generative protein folding retrieval contrastive representation").split()
+
+def _abstract(i: int) -> str:
+    rnd = random.Random(i)
+    return " ".join(rnd.choices(WORDS, k=60))
+
+def _atom(start: int, n: int, query: str) -> str:
+    entries = "".join(
+        f"<entry><id>http://arxiv.org/abs/2101.{i:05d}v1</id><title>Stub paper {i} on {query[:30]}</title>"
+        f"<summary>{_abstract(i)}</summary><link href=\"http://arxiv.org/abs/2101.{i:05d}v1\"/>"
+        f"<published>2021-01-01T00:00:00Z</published><author><name>Author {i}</name></author>"
+        f"<arxiv:primary_category xmlns:arxiv=\"http://arxiv.org/schemas/atom\" term=\"cs.LG\"/></entry>"
+        for i in range(start, start + n))
+    return f'<?xml version="1.0"?><feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>'
+
+def _s2(i: int) -> dict:
+    return {"paperId": f"s2{i:06d}", "url": f"https://www.semanticscholar.org/p/{i}", "title": f"Stub S2 paper {i}",
+            "abstract": _abstract(10_000 + i), "authors": [{"name": f"Writer {i}"}], "year": 2020, "venue": "NeurIPS",
+            "citationCount": i, "influentialCitationCount": i // 10,
+            "externalIds": {"ArXiv": f"2101.{i:05d}"} if i % 4 == 0 else {}}
+
+class StubServer:
+    def __init__(self, latency: float = 0.05, throttle: float = 0.0, seed: int = 0):
+        self.latency, self.throttle = latency, throttle
+        self.rnd = random.Random(seed)
+        self.calls: dict[str, int] = {}
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *a):
+                pass
+
+            def _reply(self, status: int, body: str = "", ctype: str = "application/json", headers: dict | None = None):
+                b = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(b)))
+                for k, v in (headers or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(b)
+
+            def _enter(self, kind: str) -> bool:
+                time.sleep(stub.latency)
+                with stub._lock:
+                    stub.calls[kind] = stub.calls.get(kind, 0) + 1
+                    throttled = stub.rnd.random() < stub.throttle
+                if throttled:
+                    with stub._lock:
+                        stub.calls["429"] = stub.calls.get("429", 0) + 1
+                    self._reply(429, headers={"Retry-After": "1"})
+                return not throttled
+
+            def do_GET(self):
+                u = urllib.parse.urlparse(self.path)
+                qs = dict(urllib.parse.parse_qsl(u.query))
+                if u.path == "/arxiv":
+                    if not self._enter("arxiv"):
+                        return
+                    if "id_list" in qs:
+                        i = int(qs["id_list"].split(".")[-1].split("v")[0])
+                        return self._reply(200, _atom(i, 1, "id"), "application/atom+xml")
+                    return self._reply(200, _atom(int(qs.get("start", 0)), int(qs.get("max_results", 10)), qs.get("search_query", "")),
+                                       "application/atom+xml")
+                if not self._enter("s2"):
+                    return
+                if u.path.endswith("/paper/search"):
+                    off, lim = int(qs.get("offset", 0)), int(qs.get("limit", 10))
+                    return self._reply(200, json.dumps({"total": 1000, "offset": off, "next": off + lim,
+                                                        "data": [_s2(i) for i in range(off, off + lim)]}))
+                if "/paper/" in u.path:
+                    pid = u.path.rsplit("/", 1)[-1]
+                    return self._reply(200, json.dumps(_s2(int(pid[2:]) if pid.startswith("s2") else 0)))
+                self._reply(404)
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if not self._enter("s2_batch"):
+                    return
+                self._reply(200, json.dumps([_s2(int(i[2:])) if i.startswith("s2") and i[2:].isdigit() else None
+                                             for i in body.get("ids", [])]))
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        threading.Thread(target=self.httpd.serve_forever, name="bench-stub", daemon=True).start()
+
+    def reset(self):
+        with self._lock:
+            self.calls.clear()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text, self.parts = text, []
+
+class FakeModel:
+    latency = 0.3
+    chunk = 40
+    calls = 0
+    _lock = threading.Lock()
+
+    def __init__(self, *a, **kw):
+        pass
+
+    @classmethod
+    def _count(cls):
+        with cls._lock:
+            cls.calls += 1
+
+    @staticmethod
+    def reply(prompt: str, cfg: dict | None) -> str:
+        essay = "A **stub** essay with *emphasis*.\n" * 20
+        if cfg and cfg.get("response_mime_type") == "application/json":
+            return json.dumps({"essay": essay, "related": [
+                {"id_type": "arxiv", "id": "2101.00042", "title": "Stub paper 42"},
+                {"id_type": "s2", "id": "s2000007", "title": "Stub S2 paper 7"},
+                {"id_type": "unknown", "id": "", "title": "Stub S2 paper 9"}]})
+        return essay
+
+    def generate_content(self, prompt, generation_config=None, stream=False, **kw):
+        self._count()
+        time.sleep(self.latency)
+        text = self.reply(prompt, generation_config)
+        return [_Chunk(text[i:i + self.chunk]) for i in range(0, len(text), self.chunk)] if stream else _Chunk(text)
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False, **kw):
+        self._count()
+        await asyncio.sleep(self.latency)
+        text = self.reply(prompt, generation_config)
+        if not stream:
+            return _Chunk(text)
+        async def _gen():
+            for i in range(0, len(text), self.chunk):
+                yield _Chunk(text[i:i + self.chunk])
+        return _gen()
+
+    def count_tokens(self, contents):
+        return type("Count", (), {"total_tokens": len(str(contents)) // 4})()
+
+def install(stub: StubServer, gemini_latency: float, real_limits: bool):
+    import google.generativeai as genai
+    import backend, services
+    backend.ARXIV_API = stub.base + "/arxiv"
+    backend.S2_API = stub.base + "/graph/v1"
+    genai.GenerativeModel = FakeModel
+    genai.configure = lambda **kw: None
+    FakeModel.latency = gemini_latency
+    if not real_limits:
+        for service in services.RATE_LIMITS:
+            backend.configure_rate(service, 1000.0, 100)
+    return backend
+
+def reset_caches(backend):
+    import aio_backend, similar, services
+    for c in (services.LLM_CACHE, services.HTTP_CACHE):
+        if c:
+            c.clear()
+    with backend._TITLE_LOCK:
+        backend._TITLES.clear()
+    with backend._REL_LOCK:
+        backend._RELATED.clear()
+    with backend._DETAIL_LOCK:
+        backend._DETAIL_CACHE.clear()
+    if backend._GRAPH:
+        backend._GRAPH.clear()
+    if backend._INDEX:
+        backend._INDEX.clear()
+    with backend._SIMILAR_LOCK:
+        backend._SIMILAR = similar.SimilarityIndex()
+        backend._similar_loaded = False
+    aio_backend._chars_per_token = None
+
+def wait_idle(backend):
+    for pool in (backend._PREFETCH_POOL, backend._EDGE_POOL, backend._DETAIL_PREFETCH_POOL):
+        pool.submit(lambda: None).result()
+
+def _drain(q: Queue, until, timeout: float = 120.0) -> list:
+    out, deadline = [], time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            msg = q.get(timeout=0.05)
+        except Empty:
+            continue
+        out.append(msg)
+        if until(msg):
+            break
+    return out
+
+def scenario_search(backend, n: int):
+    def run():
+        q = Queue()
+        backend.search_papers_backend(f"graph neural networks {n}", n, q)
+        return {"papers": sum(1 for m in _drain(q, lambda m: m is None) if m and m[0] == "paper_added")}
+    return run
+
+def scenario_related(backend):
+    def run():
+        q = Queue()
+        backend.search_papers_backend("diffusion models", 3, q)
+        paper = next(m[1][1] for m in _drain(q, lambda m: m is None) if m and m[0] == "paper_added")
+        backend.request_related(paper, q)
+        refs = next(m[1][1] for m in _drain(q, lambda m: m and m[0] == "related") if m and m[0] == "related")
+        clicked = [r for r in refs if r["paperId"] != "N/A"][:2]
+        for r in clicked:
+            backend.fetch_paper_details_backend(r["paperId"], q)
+        _drain(q, lambda m: False, timeout=0.2)
+        return {"papers": len(clicked)}
+    return run
+
+SCENARIOS = {
+    "search_n1": lambda b: scenario_search(b, 1),
+    "search_n7": lambda b: scenario_search(b, 7),
+    "search_n15": lambda b: scenario_search(b, 15),
+    "related_click": scenario_related,
+}
+
+def measure(backend, stub: StubServer, name: str, fn, warm: bool) -> dict:
+    wait_idle(backend)
+    if not warm:
+        reset_caches(backend)
+    stub.reset()
+    FakeModel.calls = 0
+    tracemalloc.start()
+    t = time.perf_counter()
+    extra = fn()
+    wall = time.perf_counter() - t
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    calls = dict(stub.calls)
+    throttled = calls.pop("429", 0)
+    return {"scenario": name, "cache": "warm" if warm else "cold", "wall_s": round(wall, 4),
+            "api_calls": {**calls, "gemini": FakeModel.calls}, "throttled": throttled,
+            "peak_mem_kb": peak // 1024, **extra}
+
+def _git_rev() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ""
+
+def compare(results: list[dict], baseline_path: str):
+    with open(baseline_path, encoding="utf-8") as f:
+        base = {(r["scenario"], r["cache"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {baseline_path}:")
+    for r in results:
+        b = base.get((r["scenario"], r["cache"]))
+        if not b:
+            continue
+        delta = (r["wall_s"] - b["wall_s"]) / b["wall_s"] * 100 if b["wall_s"] else 0.0
+        print(f"  {r['scenario']:<14} {r['cache']:<5} {b['wall_s']:>8.3f}s -> {r['wall_s']:>8.3f}s ({delta:+.1f}%)"
+              f"  calls {sum(b['api_calls'].values())} -> {sum(r['api_calls'].values())}")
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Run the backend against local arXiv/S2 stubs and a fake Gemini model.")
+    ap.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS), help="scenario to run (default: all)")
+    ap.add_argument("--latency", type=float, default=0.05, help="stub HTTP latency in seconds")
+    ap.add_argument("--gemini-latency", type=float, default=0.3, help="fake Gemini latency in seconds")
+    ap.add_argument("--throttle", type=float, default=0.0, help="fraction of stub requests answered with 429")
+    ap.add_argument("--real-limits", action="store_true", help="keep the production rate limits instead of lifting them")
+    ap.add_argument("--out", default=RESULTS_DIR, help="directory results are saved to")
+    ap.add_argument("--compare", help="earlier results file to compare against")
+    args = ap.parse_args(argv)
+
+    os.environ["RA_CACHE_DIR"] = tempfile.mkdtemp(prefix="ra-bench-")
+    os.environ.setdefault("GOOGLE_API_KEY", "bench")
+    os.environ.setdefault("SEMANTIC_API", "bench")
+    stub = StubServer(args.latency, args.throttle)
+    backend = install(stub, args.gemini_latency, args.real_limits)
+    results = []
+    try:
+        for name in args.scenario or SCENARIOS:
+            fn = SCENARIOS[name](backend)
+            for warm in (False, True):
+                r = measure(backend, stub, name, fn, warm)
+                results.append(r)
+                print(f"{name:<14} {r['cache']:<5} {r['wall_s']:>8.3f}s  calls={r['api_calls']}  429s={r['throttled']}  "
+                      f"peak={r['peak_mem_kb']}KiB", flush=True)
+    finally:
+        stub.close()
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, time.strftime("%Y%m%d-%H%M%S") + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"rev": _git_rev(), "at": time.time(), "python": sys.version.split()[0], "args": vars(args),
+                   "results": results}, f, indent=1)
+    print(f"saved {path}")
+    if args.compare:
+        compare(results, args.compare)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+from __future__ import annotations
+import os, time, sqlite3, hashlib, threading, logging
+
+CACHE_DIR = os.getenv("RA_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "research_assistant")
+
+def key(*parts: str) -> str:
+    return hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest()
+
+class DiskCache:
+    def __init__(self, name: str, ttl: float, max_bytes: int):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        self.path = os.path.join(CACHE_DIR, f"{name}.sqlite")
+        self.ttl, self.max_bytes = ttl, max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS entries (k TEXT PRIMARY KEY, v TEXT NOT NULL, size INTEGER NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries(accessed)")
+        self._size = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, k: str) -> str | None:
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT v, size, created FROM entries WHERE k=?", (k,)).fetchone()
+            if row and now - row[2] > self.ttl:
+                self._db.execute("DELETE FROM entries WHERE k=?", (k,))
+                self._size -= row[1]
+                row = None
+            if not row:
+                self.misses += 1
+                return None
+            self._db.execute("UPDATE entries SET accessed=? WHERE k=?", (now, k))
+            self.hits += 1
+            return row[0]
+
+    def put(self, k: str, v: str):
+        size = len(v.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            old = self._db.execute("SELECT size FROM entries WHERE k=?", (k,)).fetchone()
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?,?,?,?,?)", (k, v, size, now, now))
+            self._size += size - (old[0] if old else 0)
+            self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes:
+            rows = self._db.execute("SELECT k, size FROM entries ORDER BY accessed LIMIT 32").fetchall()
+            if not rows:
+                self._size = 0
+                return
+            for k, size in rows:
+                self._db.execute("DELETE FROM entries WHERE k=?", (k,))
+                self._size -= size
+                self.evictions += 1
+                if self._size <= self.max_bytes:
+                    break
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM entries")
+            self._size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            n = self._db.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        total = self.hits + self.misses
+        return {"entries": n, "bytes": self._size, "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": self.hits / total if total else 0.0}
+
+def open_cache(name: str, ttl: float, max_bytes: int) -> DiskCache | None:
+    try:
+        return DiskCache(name, ttl, max_bytes)
+    except (OSError, sqlite3.Error) as e:
+        logging.error("Cache %s: %s", name, e)
+        return None
@@ -0,0 +1,64 @@
+from __future__ import annotations
+import threading, logging
+from contextvars import ContextVar
+from contextlib import contextmanager
+
+class Cancelled(BaseException):
+    pass
+
+class CancelToken:
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks: list = []
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                logging.debug("Cancel callback: %s", e)
+
+    def check(self):
+        if self._event.is_set():
+            raise Cancelled()
+
+    def on_cancel(self, fn):
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return lambda: self._discard(fn)
+        fn()
+        return lambda: None
+
+    def _discard(self, fn):
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+_CURRENT: ContextVar[CancelToken | None] = ContextVar("cancel_token", default=None)
+
+def current() -> CancelToken | None:
+    return _CURRENT.get()
+
+def check():
+    token = _CURRENT.get()
+    if token is not None:
+        token.check()
+
+@contextmanager
+def scope(token: CancelToken | None):
+    reset = _CURRENT.set(token)
+    try:
+        yield token
+    finally:
+        _CURRENT.reset(reset)
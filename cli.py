@@ -0,0 +1,116 @@
+from __future__ import annotations
+import sys, json, time, asyncio, argparse, logging
+from collections import Counter
+import backend, aio_backend
+
+def read_topics(src) -> list[str]:
+    topics = (line.strip() for line in src)
+    return list(dict.fromkeys(t for t in topics if t and not t.startswith("#")))
+
+def load_topics(path: str | None) -> Counter:
+    seen = Counter()
+    if not path:
+        return seen
+    try:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    seen[json.loads(line)["topic"]] += 1
+                except (ValueError, KeyError):
+                    continue
+    except FileNotFoundError:
+        pass
+    return seen
+
+def load_checkpoint(path: str | None, output: str | None = None) -> set[str]:
+    done = set(load_topics(path))
+    if not path or not output:
+        return done
+    # a crash between writing a topic's records and its checkpoint line leaves it only in the output
+    orphans = {t: n for t, n in load_topics(output).items() if t not in done}
+    if orphans:
+        with open(path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps({"topic": t, "papers": n}) + "\n" for t, n in orphans.items())
+        logging.info("Recovered %d topics already written to %s", len(orphans), output)
+    return done | orphans.keys()
+
+def api_calls() -> int:
+    return sum(s["requests"] for s in backend.transport_stats().values())
+
+async def sweep(topics: list[str], args, out, ckpt) -> int:
+    gate = asyncio.Semaphore(args.parallel)
+    papers = 0
+
+    async def _one(topic: str):
+        nonlocal papers
+        async with gate:
+            try:
+                res = await aio_backend.search_papers_async(topic, args.per_topic, mode=args.mode, batch_tokens=args.batch_tokens)
+            except Exception as e:
+                logging.error("Topic %r: %s", topic, e)
+                return
+            if args.related:
+                await asyncio.to_thread(backend.ensure_edges, [p["paperId"] for p in res])
+            lines = []
+            for p in res:
+                if args.related:
+                    p["related"] = await asyncio.to_thread(backend._related, p)
+                    p.update(backend.citation_edges(p["paperId"], fetch=False))
+                lines.append(json.dumps({"topic": topic, **p}, ensure_ascii=False) + "\n")
+            out.write("".join(lines))
+            out.flush()
+            papers += len(res)
+            if ckpt and res:
+                ckpt.write(json.dumps({"topic": topic, "papers": len(res)}) + "\n")
+                ckpt.flush()
+            logging.info("%s: %d papers", topic, len(res))
+
+    await asyncio.gather(*(_one(t) for t in topics))
+    return papers
+
+def main(argv: list[str] | None = None) -> int:
+    ap = argparse.ArgumentParser(description="Search and analyse papers for a list of topics, writing JSONL to stdout.")
+    ap.add_argument("topics", nargs="?", default="-", help="file with one topic per line ('-' for stdin)")
+    ap.add_argument("-n", "--per-topic", type=int, default=7, help="papers per topic")
+    ap.add_argument("-p", "--parallel", type=int, default=4, help="topics processed concurrently")
+    ap.add_argument("-m", "--mode", choices=backend.SEARCH_MODES, default="remote")
+    ap.add_argument("-o", "--output", help="append JSONL records to this file instead of writing to stdout")
+    ap.add_argument("-c", "--checkpoint", help="JSONL of finished topics; finished topics are skipped on rerun")
+    ap.add_argument("-b", "--batch-tokens", type=int, default=backend.ESSAY_BATCH_TOKENS,
+                    help="token budget for packing several abstracts into one Gemini request (0 = one request per paper)")
+    ap.add_argument("--related", action="store_true", help="also attach related work and citation edges to every paper")
+    args = ap.parse_args(argv)
+    if args.per_topic < 1 or args.parallel < 1:
+        ap.error("--per-topic and --parallel must be >= 1")
+    if args.batch_tokens < 0:
+        ap.error("--batch-tokens must be >= 0")
+
+    if args.topics == "-":
+        topics = read_topics(sys.stdin)
+    else:
+        with open(args.topics, encoding="utf-8") as f:
+            topics = read_topics(f)
+    done = load_checkpoint(args.checkpoint, args.output)
+    todo = [t for t in topics if t not in done]
+    if done:
+        logging.info("Resuming: %d of %d topics already done", len(topics) - len(todo), len(topics))
+
+    calls0, t0 = api_calls(), time.perf_counter()
+    ckpt = open(args.checkpoint, "a", encoding="utf-8") if args.checkpoint else None
+    out = open(args.output, "a", encoding="utf-8") if args.output else sys.stdout
+    try:
+        papers = aio_backend.run(sweep(todo, args, out, ckpt))
+    finally:
+        if ckpt:
+            ckpt.close()
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - t0
+    calls = api_calls() - calls0
+    print(f"{len(todo)} topics, {papers} papers in {elapsed:.1f}s: "
+          f"{papers / elapsed * 60 if elapsed else 0.0:.1f} papers/min, "
+          f"{calls / papers if papers else 0.0:.2f} API calls/paper", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+from __future__ import annotations
+import os, time, sqlite3, threading, logging
+import cache
+
+COCITE_WEIGHT = 1.0
+DIRECT_WEIGHT = 3.0
+
+class CitationGraph:
+    def __init__(self, path: str, ttl: float):
+        self.path, self.ttl = path, ttl
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS nodes (id INTEGER PRIMARY KEY, s2 TEXT UNIQUE NOT NULL, title TEXT, year INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS aliases (pid TEXT PRIMARY KEY, node INTEGER NOT NULL) WITHOUT ROWID")
+        self._db.execute("CREATE TABLE IF NOT EXISTS edges (src INTEGER NOT NULL, dst INTEGER NOT NULL, PRIMARY KEY (src, dst)) WITHOUT ROWID")
+        self._db.execute("CREATE INDEX IF NOT EXISTS edges_dst ON edges (dst, src)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS fetched (pid TEXT PRIMARY KEY, at REAL NOT NULL) WITHOUT ROWID")
+
+    def _node(self, d: dict) -> int | None:
+        s2 = d.get("paperId")
+        if not s2:
+            return None
+        self._db.execute("INSERT INTO nodes (s2, title, year) VALUES (?,?,?) ON CONFLICT (s2) DO UPDATE SET "
+                         "title=coalesce(excluded.title, title), year=coalesce(excluded.year, year)", (s2, d.get("title"), d.get("year")))
+        return self._db.execute("SELECT id FROM nodes WHERE s2=?", (s2,)).fetchone()[0]
+
+    def _resolve(self, pid: str) -> int | None:
+        if pid.startswith("S2:"):
+            row = self._db.execute("SELECT id FROM nodes WHERE s2=?", (pid[3:],)).fetchone()
+        else:
+            row = self._db.execute("SELECT node FROM aliases WHERE pid=?", (pid,)).fetchone()
+        return row[0] if row else None
+
+    def add(self, pid: str, paper: dict | None):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                node = self._node(paper) if paper else None
+                if node is not None:
+                    if not pid.startswith("S2:"):
+                        self._db.execute("INSERT OR REPLACE INTO aliases VALUES (?,?)", (pid, node))
+                    edges = [(node, n) for n in map(self._node, paper.get("references") or ()) if n is not None]
+                    edges += [(n, node) for n in map(self._node, paper.get("citations") or ()) if n is not None]
+                    self._db.executemany("INSERT OR IGNORE INTO edges VALUES (?,?)", edges)
+                self._db.execute("INSERT OR REPLACE INTO fetched VALUES (?,?)", (pid, time.time()))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def fetched(self, pids: list[str]) -> set[str]:
+        with self._lock:
+            since = time.time() - self.ttl
+            return {p for p in pids if self._db.execute("SELECT 1 FROM fetched WHERE pid=? AND at > ?", (p, since)).fetchone()}
+
+    def _papers(self, sql: str, args: tuple, order: str = "n.year DESC") -> list[dict]:
+        rows = self._db.execute(f"SELECT n.s2, n.title, n.year FROM ({sql}) c JOIN nodes n ON n.id = c.id ORDER BY {order}", args).fetchall()
+        return [{"paperId": f"S2:{s2}", "title": title or "N/A", "year": year, "source": "Semantic Scholar"} for s2, title, year in rows]
+
+    def references(self, pid: str, limit: int = 100) -> list[dict]:
+        with self._lock:
+            node = self._resolve(pid)
+            return [] if node is None else self._papers("SELECT dst AS id FROM edges WHERE src=? LIMIT ?", (node, limit))
+
+    def citations(self, pid: str, limit: int = 100) -> list[dict]:
+        with self._lock:
+            node = self._resolve(pid)
+            return [] if node is None else self._papers("SELECT src AS id FROM edges WHERE dst=? LIMIT ?", (node, limit))
+
+    def citing_all(self, pids: list[str], limit: int = 100) -> list[dict]:
+        with self._lock:
+            nodes = {self._resolve(p) for p in pids}
+            if not nodes or None in nodes:
+                return []
+            marks = ",".join("?" * len(nodes))
+            return self._papers(f"SELECT src AS id FROM edges WHERE dst IN ({marks}) GROUP BY src HAVING COUNT(*) = ? LIMIT ?",
+                                (*nodes, len(nodes), limit))
+
+    def related(self, pid: str, limit: int) -> list[dict]:
+        with self._lock:
+            node = self._resolve(pid)
+            if node is None:
+                return []
+            return self._papers(
+                "SELECT id, SUM(w) AS score FROM ("
+                " SELECT dst AS id, ? AS w FROM edges WHERE src = ?"
+                " UNION ALL SELECT src, ? FROM edges WHERE dst = ?"
+                " UNION ALL SELECT b.src, ? FROM edges a JOIN edges b ON b.dst = a.dst WHERE a.src = ?"
+                " UNION ALL SELECT b.dst, ? FROM edges a JOIN edges b ON b.src = a.src WHERE a.dst = ?"
+                ") WHERE id != ? GROUP BY id ORDER BY score DESC LIMIT ?",
+                (DIRECT_WEIGHT, node, DIRECT_WEIGHT, node, COCITE_WEIGHT, node, COCITE_WEIGHT, node, node, limit), "c.score DESC, n.year DESC")
+
+    def clear(self):
+        with self._lock:
+            for t in ("edges", "aliases", "fetched", "nodes"):
+                self._db.execute(f"DELETE FROM {t}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {t: self._db.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0] for t in ("nodes", "edges", "fetched")}
+
+def open_graph(name: str, ttl: float) -> CitationGraph | None:
+    try:
+        os.makedirs(cache.CACHE_DIR, exist_ok=True)
+        return CitationGraph(os.path.join(cache.CACHE_DIR, f"{name}.sqlite"), ttl)
+    except (OSError, sqlite3.Error) as e:
+        logging.error("Graph %s: %s", name, e)
+        return None
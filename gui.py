@@ -4,12 +4,134 @@ from tkinter.scrolledtext import ScrolledText
 import threading
 from queue import Queue, Empty
 import backend
+import cancel
 import webbrowser
 import re
+import time
+from collections import deque
 from ttkbootstrap import Style
 
 RELATED_LIMIT = 4
-TYPE_SPEED_MS = 1
+RELATED_HDR = "--- Related Work (click title) ---"
+PREFETCH_AHEAD = 3
+MAX_TOPLEVELS = 5
+FRAME_MS = 16
+FRAME_BUDGET_MS = 8
+MD_PATTERN = re.compile(r"(\*\*(.*?)\*\*)|(\*(.*?)\*)")
+
+
+def md_segments(text):
+    out, last = [], 0
+    for m in MD_PATTERN.finditer(text):
+        if m.start() > last:
+            out.append((text[last:m.start()], ()))
+        out.append((m.group(2), ("bold",)) if m.group(1) else (m.group(4), ("italic_grey",)))
+        last = m.end()
+    if last < len(text):
+        out.append((text[last:], ()))
+    return out
+
+
+class MarkdownStream:
+    def __init__(self):
+        self.buf = ""
+
+    def feed(self, chunk, final=False):
+        self.buf += chunk
+        if final:
+            text, self.buf = self.buf, ""
+            return md_segments(text)
+        nl = self.buf.rfind("\n") + 1
+        done, line = self.buf[:nl], self.buf[nl:]
+        out = md_segments(done)
+        last = 0
+        for m in MD_PATTERN.finditer(line):
+            body = m.group(2) if m.group(1) else m.group(4)
+            if not body or m.end() >= len(line) or line[m.end()] == "*":
+                break
+            out += md_segments(line[last:m.end()])
+            last = m.end()
+        star = line.find("*", last)
+        cut = len(line) if star < 0 else star
+        out += md_segments(line[last:cut])
+        self.buf = line[cut:]
+        return out
+
+
+class TextRenderer:
+    def __init__(self, root, budget_ms=FRAME_BUDGET_MS):
+        self.root = root
+        self.budget = budget_ms / 1000
+        self.queues = {}
+        self.following = set()
+        self.job = None
+        self.chunk = 512
+        self.chars = 0
+        self.elapsed = 0.0
+
+    @property
+    def cps(self):
+        return self.chars / self.elapsed if self.elapsed else 0.0
+
+    def write(self, widget, segments, at=tk.END, follow=False):
+        if follow:
+            self.following.add(widget)
+        q = self.queues.setdefault(widget, deque())
+        q.extend((at, t, tags) for t, tags in segments if t)
+        if q and self.job is None:
+            self.job = self.root.after_idle(self._tick)
+
+    def cancel(self, widget):
+        self.queues.pop(widget, None)
+        self.following.discard(widget)
+
+    def stop(self):
+        self.queues.clear()
+        self.following.clear()
+        if self.job:
+            try: self.root.after_cancel(self.job)
+            except: pass
+            self.job = None
+
+    def _tick(self):
+        self.job = None
+        start = time.perf_counter()
+        deadline = start + self.budget
+        per_widget = max(1, self.chunk // max(1, len(self.queues)))
+        written = 0
+        for widget, q in list(self.queues.items()):
+            if time.perf_counter() >= deadline:
+                break
+            if not widget.winfo_exists():
+                self.cancel(widget)
+                continue
+            at = q[0][0]
+            args, n = [], 0
+            while q and q[0][0] == at and n < per_widget:
+                _, text, tags = q[0]
+                piece = text[:per_widget - n]
+                args += [piece, tags]
+                n += len(piece)
+                if len(piece) < len(text):
+                    q[0] = (at, text[len(piece):], tags)
+                else:
+                    q.popleft()
+            widget.config(state=tk.NORMAL)
+            widget.insert(at, *args)
+            if widget in self.following:
+                widget.see(at)
+            widget.config(state=tk.DISABLED)
+            written += n
+            if not q:
+                self.cancel(widget)
+        spent = time.perf_counter() - start
+        if written:
+            self.chars += written
+            self.elapsed += spent
+            self.chunk = max(64, int(self.cps * self.budget))
+        if self.queues:
+            self.job = self.root.after(FRAME_MS, self._tick)
+
 
 class ResearchAssistantApp:
     def __init__(self, root):
@@ -22,13 +144,24 @@ class ResearchAssistantApp:
         self.root.protocol("WM_DELETE_WINDOW", self._quit_app)
 
         self.queue = Queue()
+        self.search_q = Queue()
+        self.search_token = None
+        self.detail_tokens = {}
+        self.renderer = TextRenderer(root)
         self.limit_var = tk.IntVar(value=7)
+        self.mode_var = tk.StringVar(value=backend.SEARCH_MODES[0])
         self.papers = []
+        self.cursor = None
+        self.metrics = {}
         self.fetching_search = False
-        self.fetching_related = False
         self.active_toplevels = {}
-        self.typing_jobs = {}
-        self.displayed_ids = set()
+        self.toplevel_texts = {}
+        self.pending = {}
+        self.details_pending = set()
+        self.streams = {}
+        self.md_streams = {}
+        self.related_loaded = set()
+        self.prefetching = set()
         self.current_paper_id = None
 
         top = ttk.Frame(root, padding=10)
@@ -46,16 +179,25 @@ class ResearchAssistantApp:
             validatecommand=(top.register(lambda v: v.isdigit() and 1 <= int(v) <= 15), "%P")
         )
         spin.pack(side=tk.LEFT, padx=(0,6))
+        ttk.Combobox(
+            top, textvariable=self.mode_var, values=backend.SEARCH_MODES,
+            state="readonly", width=7, bootstyle="info"
+        ).pack(side=tk.LEFT, padx=(0,6))
         self.search_button = ttk.Button(
             top, text="Search", bootstyle="success-outline", command=self.start_search
         )
         self.search_button.pack(side=tk.LEFT)
         self.entry.bind("<Return>", lambda e: self.start_search())
+        self.root.bind("<F2>", lambda e: self.show_metrics())
 
         paned = ttk.PanedWindow(root, orient=tk.HORIZONTAL)
         paned.pack(fill=tk.BOTH, expand=True, padx=10, pady=(0,10))
 
         lf = ttk.LabelFrame(paned, text="Found Papers", bootstyle="info", padding=5)
+        self.more_button = ttk.Button(
+            lf, text="Load more", bootstyle="info-outline", command=self.load_more, state=tk.DISABLED
+        )
+        self.more_button.pack(side=tk.BOTTOM, fill=tk.X, pady=(5,0))
         self.listbox = tk.Listbox(
             lf, activestyle="none", exportselection=False,
             bg=style.colors.dark, fg=style.colors.light,
@@ -65,7 +207,7 @@ class ResearchAssistantApp:
         self.listbox.bind("<<ListboxSelect>>", self.on_listbox_select)
         sb = ttk.Scrollbar(lf, command=self.listbox.yview, bootstyle="info-round")
         sb.pack(side=tk.RIGHT, fill=tk.Y)
-        self.listbox.config(yscrollcommand=sb.set)
+        self.listbox.config(yscrollcommand=lambda first, last: self._on_list_scroll(sb, first, last))
         paned.add(lf, weight=1)
 
         rf = ttk.LabelFrame(paned, text="Details & Insights", bootstyle="info", padding=5)
@@ -92,11 +234,9 @@ class ResearchAssistantApp:
         )
         self.status.pack(fill=tk.X)
 
-        self.text.tag_configure("bold", font=("Segoe UI", 10, "bold"))
+        self._configure_tags(self.text)
         self.text.tag_configure("link", underline=True, foreground=style.colors.info)
         self.text.tag_configure("clickable_title", underline=True, foreground=style.colors.success)
-        self.text.tag_configure("italic_grey", font=("Segoe UI", 9, "italic"), foreground=style.colors.light)
-        self.text.tag_configure("error", foreground=style.colors.danger)
         for tag in ("link", "clickable_title"):
             self.text.tag_bind(tag, "<Enter>", self._enter_link)
             self.text.tag_bind(tag, "<Leave>", self._leave_link)
@@ -105,11 +245,18 @@ class ResearchAssistantApp:
         self.check_queue()
 
 
+    def _configure_tags(self, widget):
+        widget.tag_configure("bold", font=("Segoe UI", 10, "bold"))
+        widget.tag_configure("italic_grey", font=("Segoe UI", 9, "italic"), foreground=self.style.colors.light)
+        widget.tag_configure("error", foreground=self.style.colors.danger)
+
+
     def _quit_app(self):
-        for job in list(self.typing_jobs.values()):
-            if job:
-                try: self.root.after_cancel(job)
-                except: pass
+        if self.search_token:
+            self.search_token.cancel()
+        for token in self.detail_tokens.values():
+            token.cancel()
+        self.renderer.stop()
         for win in list(self.active_toplevels.values()):
             if win.winfo_exists():
                 win.destroy()
@@ -125,10 +272,6 @@ class ResearchAssistantApp:
 
 
     def _click_handler(self, event):
-        if self.fetching_related:
-            self.update_status("Busy fetching…")
-            return
-
         idx = event.widget.index(f"@{event.x},{event.y}")
         tags = event.widget.tag_names(idx)
         line = event.widget.get(f"{idx} linestart", f"{idx} lineend")
@@ -152,13 +295,15 @@ class ResearchAssistantApp:
                     win.lift(); win.focus_force()
                     return
 
-            self.fetching_related = True
-            self.search_button.config(state=tk.DISABLED)
-            threading.Thread(
-                target=backend.fetch_paper_details_backend,
-                args=(pid, self.queue),
-                daemon=True
-            ).start()
+            if pid in self.detail_tokens:
+                self.update_status(f"Already fetching {pid}…")
+                return
+            if len(self.active_toplevels.keys() | self.detail_tokens.keys()) >= MAX_TOPLEVELS:
+                messagebox.showwarning("Window Limit", "Close some related windows first.")
+                return
+
+            token = self.detail_tokens[pid] = cancel.CancelToken()
+            backend.request_details(pid, self.queue, token)
 
 
     def update_status(self, msg):
@@ -167,124 +312,146 @@ class ResearchAssistantApp:
 
 
     def start_search(self):
-        if self.fetching_search or self.fetching_related:
-            messagebox.showwarning("Busy", "Please wait until current operation completes.")
-            return
-
         topic = self.entry.get().strip()
         if not topic:
             messagebox.showwarning("Input Error", "Please enter a topic.")
             return
 
+        if self.search_token:
+            self.search_token.cancel()
+        self.search_token = cancel.CancelToken()
+        self.search_q = Queue()
+        self.renderer.cancel(self.text)
+
         self.listbox.delete(0, tk.END)
         self.text.config(state=tk.NORMAL); self.text.delete("1.0", tk.END); self.text.config(state=tk.DISABLED)
         self.details_title_label.config(text="Details & Insights")
-        self.papers.clear(); self.displayed_ids.clear(); self.current_paper_id = None
+        self.cursor = None; self.more_button.config(state=tk.DISABLED)
+        self.papers.clear(); self.pending.clear(); self.related_loaded.clear(); self.prefetching.clear(); self.current_paper_id = None
+        self.streams.clear(); self.md_streams.clear()
 
         self.update_status(f"Searching for '{topic}'…")
         self.fetching_search = True
-        self.search_button.config(state=tk.DISABLED)
         threading.Thread(
             target=backend.search_papers_backend,
-            args=(topic, self.limit_var.get(), self.queue),
+            args=(topic, self.limit_var.get(), self.search_q, self.mode_var.get(), None, self.search_token),
             daemon=True
         ).start()
 
 
-    def _cancel_typing(self, widget):
-        wid = str(widget)
-        job = self.typing_jobs.pop(wid, None)
-        if job:
-            try: widget.after_cancel(job)
-            except: pass
-        if widget.winfo_exists() and widget["state"] == tk.NORMAL:
-            widget.config(state=tk.DISABLED)
+    def show_metrics(self):
+        if not self.metrics:
+            messagebox.showinfo("Timings", "No timings recorded yet.")
+            return
+        rows = sorted(self.metrics.items(), key=lambda kv: -kv[1]["p95_ms"])[:12]
+        pf = backend.prefetch_stats()
+        messagebox.showinfo("Timings", "\n".join(
+            [f"{name}: n={s['count']} p50={s['p50_ms']:.0f}ms p95={s['p95_ms']:.0f}ms" for name, s in rows] +
+            [f"prefetch: {pf['prefetched']} warmed, {pf['used_rate']:.0%} used, "
+             f"click hit rate {pf['hit_rate']:.0%} ({pf['hits']}/{pf['requests']}), {pf['over_budget']} over budget, {pf['dropped']} dropped (queue full)",
+             f"render: {self.renderer.cps:.0f} chars/s, {self.renderer.chunk} chars/frame"]))
 
 
-    def _type_text(self, widget, text, pid, idx=0):
-        wid = str(widget)
-        if not widget.winfo_exists():
-            self.typing_jobs.pop(wid, None)
+    def load_more(self):
+        if self.fetching_search or not self.cursor or self.cursor["done"]:
             return
+        self.fetching_search = True
+        self.more_button.config(state=tk.DISABLED)
+        threading.Thread(
+            target=backend.search_papers_backend,
+            args=(self.cursor["query"], self.limit_var.get(), self.search_q, self.cursor["mode"], self.cursor, self.search_token),
+            daemon=True
+        ).start()
 
-        if idx == 0:
-            prev = self.typing_jobs.get(wid)
-            if prev:
-                try: widget.after_cancel(prev)
-                except: pass
-            self.typing_jobs[wid] = None
-            if widget["state"] == tk.DISABLED:
-                widget.config(state=tk.NORMAL)
-
-            hdr = "--- Gemini Insights/Essay ---\n"
-            if widget is not self.text:
-                hdr = "--- Gemini Analytical Essay ---\n"
-            pos = widget.search(hdr, "1.0", stopindex=tk.END)
-            if pos:
-                widget.delete(f"{pos} lineend+1c", tk.END)
-                widget.insert(tk.END, "\n")
-            else:
-                widget.delete("1.0", tk.END)
-                widget.insert("1.0", hdr + "\n")
-            self.displayed_ids.add(pid)
-
-        if idx < len(text):
-            widget.insert(tk.END + "-1c", text[idx])
-            widget.see(tk.END)
-            job = widget.after(TYPE_SPEED_MS, self._type_text, widget, text, pid, idx+1)
-            self.typing_jobs[wid] = job
-        else:
-            widget.insert(tk.END, "\n\n")
+
+    def _on_list_scroll(self, sb, first, last):
+        sb.set(first, last)
+        if float(first) > 0 and float(last) >= 1.0:
+            self.load_more()
+
+
+    def _essay_end(self, widget):
+        return "essay_end" if "essay_end" in widget.mark_names() else tk.END
+
+
+    def _essay_widgets(self, pid):
+        if pid == self.current_paper_id:
+            yield self.text
+        txt = self.toplevel_texts.get(pid)
+        if txt is not None and txt.winfo_exists():
+            yield txt
+
+
+    def _append_essay(self, widget, segments):
+        rng = widget.tag_ranges("essay_placeholder")
+        if rng:
+            widget.config(state=tk.NORMAL)
+            widget.delete(rng[0], rng[-1])
             widget.config(state=tk.DISABLED)
-            self.typing_jobs.pop(wid, None)
+        self.renderer.write(widget, segments, self._essay_end(widget), follow=True)
+
+
+    def _on_essay_chunk(self, pid, chunk):
+        segments = self.md_streams.setdefault(pid, MarkdownStream()).feed(chunk)
+        self.streams.setdefault(pid, []).extend(segments)
+        for widget in self._essay_widgets(pid):
+            self._append_essay(widget, segments)
+
+
+    def _end_stream(self, pid):
+        self.streams.pop(pid, None)
+        self.md_streams.pop(pid, None)
+
 
+    def _flush_stream(self, pid):
+        md = self.md_streams.get(pid)
+        streamed = md is not None and bool(self.streams.get(pid))
+        if streamed:
+            tail = md.feed("", final=True) + [("\n\n", ())]
+            for widget in self._essay_widgets(pid):
+                self._append_essay(widget, tail)
+        self._end_stream(pid)
+        return streamed
 
-    def _insert_formatted_instantly(self, widget, pid, content):
-        self._cancel_typing(widget)
+
+    def _insert_formatted(self, widget, content):
         if not widget.winfo_exists(): return
+        self.renderer.cancel(widget)
         widget.config(state=tk.NORMAL)
 
         hdr = "--- Gemini Insights/Essay ---\n"
         if widget is not self.text:
             hdr = "--- Gemini Analytical Essay ---\n"
+        stop = self._essay_end(widget)
         pos = widget.search(hdr, "1.0", stopindex=tk.END)
         if pos:
-            widget.delete(f"{pos} lineend+1c", tk.END)
-            ins = widget.index(f"{pos} lineend+1c +1c")
+            widget.delete(f"{pos} lineend+1c", stop)
         else:
             widget.delete("1.0", tk.END)
             widget.insert("1.0", hdr + "\n")
-            ins = "2.0"
-
-        pattern = re.compile(r"(\*\*(.*?)\*\*)|(\*(.*?)\*)")
-        last = 0
-        for m in pattern.finditer(content):
-            start, end = m.span()
-            plain = content[last:start]
-            if plain:
-                widget.insert(ins, plain)
-                ins = widget.index(f"{ins} +{len(plain)}c")
-
-            if m.group(1):
-                tag, txt = "bold", m.group(2)
-            else:
-                tag, txt = "italic_grey", m.group(4)
-            widget.insert(ins, txt, (tag,))
-            ins = widget.index(f"{ins} +{len(txt)}c")
-            last = end
-
-        tail = content[last:]
-        if tail:
-            widget.insert(ins, tail)
-
-        widget.insert(tk.END, "\n\n")
         widget.config(state=tk.DISABLED)
-        self.displayed_ids.add(pid)
+        self.renderer.write(widget, md_segments(content) + [("\n\n", ())], stop)
+
+
+    def _render_essay(self, widget, data, pending):
+        pid = data.get("paperId")
+        insights = data.get("insights","")
+        at = self._essay_end(widget)
+        if pending and pid in self.streams:
+            self.renderer.write(widget, self.streams[pid], at)
+        elif pending:
+            widget.insert(at, "Generating analysis…\n\n", ("italic_grey", "essay_placeholder"))
+        elif not insights:
+            widget.insert(at, "No analysis available.\n\n", ("italic_grey",))
+        elif insights.startswith("Error:") or insights.startswith("Content blocked"):
+            widget.insert(at, insights + "\n\n", ("error",))
+        else:
+            self._insert_formatted(widget, insights)
 
 
-    def _populate_main_details_widgets(self, widget, data, skip_typing=False):
+    def _populate_main_details_widgets(self, widget, data):
         pid = data.get("paperId")
-        self._cancel_typing(widget)
+        self.renderer.cancel(widget)
         widget.config(state=tk.NORMAL)
         widget.delete("1.0", tk.END)
 
@@ -317,21 +484,28 @@ class ResearchAssistantApp:
         widget.insert(tk.END, data.get("abstract","N/A") + "\n\n")
         widget.insert(tk.END, "--- Gemini Insights/Essay ---\n", ("bold",))
 
-        insights = data.get("insights","")
-        is_err = insights.startswith("Error:") or insights.startswith("Content blocked")
-        if is_err:
-            widget.insert(tk.END, insights + "\n\n", ("error",))
-            self.displayed_ids.add(pid)
-        elif skip_typing:
-            self._insert_formatted_instantly(widget, pid, insights)
-        else:
-            widget.config(state=tk.DISABLED)
-            self.root.after(50, self._type_text, widget, insights, pid, 0)
+        essay_pos = widget.index("end-1c")
+        self._render_related(widget, data)
+        widget.mark_set("essay_end", essay_pos)
 
         widget.config(state=tk.NORMAL)
-        widget.insert(tk.END, "\n--- Related Work (click title) ---\n", ("bold",))
-        related = data.get("references",[]) + data.get("citations",[])
-        shown = 0
+        self._render_essay(widget, data, "insights" in self.pending.get(pid, ()))
+        widget.config(state=tk.DISABLED)
+
+
+    def _render_related(self, widget, data):
+        pid = data.get("paperId")
+        prev = widget["state"]
+        widget.config(state=tk.NORMAL)
+        pos = widget.search(RELATED_HDR, "1.0", stopindex=tk.END)
+        if pos:
+            mark = widget.index("essay_end")
+            widget.delete(f"{pos} -1c", tk.END)
+        widget.insert(tk.END, f"\n{RELATED_HDR}\n", ("bold",))
+        if "related" in self.pending.get(pid, ()):
+            widget.insert(tk.END, "  Finding related work…\n", ("italic_grey",))
+        related = data.get("related") or data.get("references",[]) + data.get("citations",[])
+        shown, visible = 0, []
         for itm in related:
             if shown >= RELATED_LIMIT: break
             rid, title = itm.get("paperId"), itm.get("title","N/A")
@@ -341,73 +515,118 @@ class ResearchAssistantApp:
             end = widget.index(tk.INSERT)
             if rid:
                 widget.tag_add("clickable_title", start, end)
+                visible.append(rid)
             shown += 1
-
-        widget.config(state=tk.DISABLED)
+        if pos:
+            widget.mark_set("essay_end", mark)
+        widget.config(state=prev)
+        backend.prefetch_details(visible, token=self.search_token)
 
 
     def _populate_related_window_widgets(self, widget, data):
         pid = data.get("paperId")
+        self.renderer.cancel(widget)
         widget.config(state=tk.NORMAL)
         widget.delete("1.0", tk.END)
         widget.insert(tk.END, "--- Abstract ---\n", ("bold",))
         widget.insert(tk.END, data.get("abstract","N/A") + "\n\n")
         widget.insert(tk.END, "--- Gemini Analytical Essay ---\n", ("bold",))
-
-        insights = data.get("insights","")
-        if insights.startswith("Error:") or insights.startswith("Content blocked"):
-            widget.insert(tk.END, insights + "\n\n", ("error",))
-            widget.config(state=tk.DISABLED)
-            self.displayed_ids.add(pid)
-        else:
-            widget.config(state=tk.DISABLED)
-            self.root.after(50, self._type_text, widget, insights, pid, 0)
+        self._render_essay(widget, data, pid in self.details_pending)
+        widget.config(state=tk.DISABLED)
 
 
     def check_queue(self):
         try:
-            while True:
-                msg = self.queue.get_nowait()
-                if msg is None:
-                    self.fetching_search = False
-                    if not self.fetching_related:
-                        self.search_button.config(state=tk.NORMAL)
-                    self.update_status("Search Finished")
-                else:
-                    kind, data = msg
-                    if kind == "status":
-                        self.update_status(data)
-                    elif kind == "papers":
-                        self.fetching_search = False
-                        self.search_button.config(state=tk.NORMAL)
-                        self.papers = data
-                        self.listbox.delete(0, tk.END)
-                        for i,p in enumerate(data,1):
-                            year = p.get("year","N/A")
-                            title = p.get("title","N/A")[:70]
-                            self.listbox.insert(tk.END, f"{i}. ({year}) {title}")
-                        if self.papers:
-                            self.listbox.selection_set(0)
-                            self.display_main_paper_details(self.papers[0])
-                        else:
-                            self.update_status("No papers found.")
-                    elif kind == "paper_details":
-                        self.fetching_related = False
-                        self.search_button.config(state=tk.NORMAL)
-                        self.show_related_paper_window(data)
-                    elif kind == "paper_details_error":
-                        self.fetching_related = False
-                        self.search_button.config(state=tk.NORMAL)
-                        messagebox.showerror("Fetch Error", f"Could not fetch details:\n{data}")
-        except Empty:
-            pass
+            for q in (self.search_q, self.queue):
+                while True:
+                    try:
+                        msg = q.get_nowait()
+                    except Empty:
+                        break
+                    self._handle_message(msg)
         finally:
             self.root.after(100, self.check_queue)
 
 
-    def on_listbox_select(self, event):
-        if self.fetching_search or self.fetching_related:
+    def _handle_message(self, msg):
+        if msg is None:
+            self.fetching_search = False
+            self.update_status("Search Finished")
+        else:
+            kind, data = msg
+            if kind == "status":
+                self.update_status(data)
+            elif kind == "metrics":
+                self.metrics = data
+            elif kind == "cursor":
+                self.cursor = data
+                self.more_button.config(state=tk.DISABLED if data["done"] else tk.NORMAL)
+            elif kind == "paper_added":
+                _, p = data
+                self.papers.append(p)
+                self.pending[p.get("paperId")] = {"insights"}
+                year = p.get("year","N/A")
+                title = p.get("title","N/A")[:70]
+                self.listbox.insert(tk.END, f"{len(self.papers)}. ({year}) {title}")
+                if len(self.papers) == 1:
+                    self.listbox.selection_set(0)
+                    self.display_main_paper_details(p)
+            elif kind == "paper_updated":
+                i, fields = data
+                if i < len(self.papers) and self.papers[i].get("paperId") == fields.get("paperId"):
+                    self._apply_paper_update(self.papers[i], fields)
+            elif kind == "related":
+                pid, refs = data
+                self.related_loaded.add(pid)
+                for p in self.papers:
+                    if p.get("paperId") == pid:
+                        self._apply_paper_update(p, {"related": refs})
+            elif kind == "essay_chunk":
+                self._on_essay_chunk(*data)
+            elif kind == "paper_details":
+                pid, rec = data
+                if pid not in self.detail_tokens:
+                    return
+                if rec.get("abstract"):
+                    self.details_pending.add(pid)
+                self.show_related_paper_window({**rec, "paperId": pid})
+            elif kind == "essay_done":
+                pid, text = data
+                self.detail_tokens.pop(pid, None)
+                self.details_pending.discard(pid)
+                streamed = self._flush_stream(pid)
+                txt = self.toplevel_texts.get(pid)
+                if not streamed and txt is not None and txt.winfo_exists():
+                    txt.config(state=tk.NORMAL)
+                    rng = txt.tag_ranges("essay_placeholder")
+                    if rng:
+                        txt.delete(rng[0], rng[-1])
+                    self._render_essay(txt, {"paperId": pid, "insights": text}, False)
+                    txt.config(state=tk.DISABLED)
+            elif kind == "paper_details_error":
+                pid, err = data
+                if self.detail_tokens.pop(pid, None):
+                    messagebox.showerror("Fetch Error", f"Could not fetch details for {pid}:\n{err}")
+
+
+    def _apply_paper_update(self, paper, fields):
+        pid = paper.get("paperId")
+        paper.update(fields)
+        left = self.pending.get(pid)
+        if left is not None:
+            left.difference_update(fields)
+        streamed = False
+        if "insights" in fields:
+            streamed = self._flush_stream(pid)
+        if pid != self.current_paper_id:
             return
+        if "insights" in fields and not streamed:
+            self.display_main_paper_details(paper)
+        elif "related" in fields:
+            self._render_related(self.text, paper)
+
+
+    def on_listbox_select(self, event):
         sel = self.listbox.curselection()
         if not sel:
             return
@@ -426,11 +645,26 @@ class ResearchAssistantApp:
             self.text.insert("1.0", "Error: Missing ID.")
             self.text.config(state=tk.DISABLED)
             return
-        skip = pid in self.displayed_ids
         self.current_paper_id = pid
+        self._ensure_related(data)
         title = data.get("title","N/A")
         self.details_title_label.config(text=f"Details for: {title[:80]}…")
-        self._populate_main_details_widgets(self.text, data, skip_typing=skip)
+        self._populate_main_details_widgets(self.text, data)
+
+
+    def _ensure_related(self, data):
+        pid = data.get("paperId")
+        if pid not in self.related_loaded and "related" not in self.pending.get(pid, ()):
+            self.pending.setdefault(pid, set()).add("related")
+            backend.request_related(data, self.queue, token=self.search_token)
+        idx = next((i for i,p in enumerate(self.papers) if p.get("paperId") == pid), None)
+        if idx is None:
+            return
+        for p in self.papers[idx+1:idx+1+PREFETCH_AHEAD]:
+            nid = p.get("paperId")
+            if nid not in self.related_loaded and nid not in self.prefetching:
+                self.prefetching.add(nid)
+                backend.request_related(p, self.queue, prefetch=True, token=self.search_token)
 
 
     def show_related_paper_window(self, data):
@@ -443,7 +677,7 @@ class ResearchAssistantApp:
             if win.winfo_exists():
                 win.lift(); win.focus_force()
                 return
-        if len(self.active_toplevels) >= 5:
+        if len(self.active_toplevels) >= MAX_TOPLEVELS:
             messagebox.showwarning("Window Limit", "Close some related windows first.")
             return
 
@@ -460,16 +694,19 @@ class ResearchAssistantApp:
 
         txt = ScrolledText(frm, wrap=tk.WORD, state=tk.DISABLED)
         txt.grid(row=0, column=0, sticky="nsew")
+        self._configure_tags(txt)
+        self.toplevel_texts[pid] = txt
 
         self._populate_related_window_widgets(txt, data)
 
 
     def _close_toplevel(self, win, pid):
-        try:
-            txt = win.winfo_children()[0].winfo_children()[0]
-            self._cancel_typing(txt)
-        except:
-            pass
+        token = self.detail_tokens.pop(pid, None)
+        if token:
+            token.cancel()
+        txt = self.toplevel_texts.pop(pid, None)
+        if txt is not None:
+            self.renderer.cancel(txt)
         self.active_toplevels.pop(pid, None)
         if win.winfo_exists():
             win.destroy()
@@ -0,0 +1,86 @@
+from __future__ import annotations
+import os, re, json, time, sqlite3, threading, logging
+import cache
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+def fts_query(text: str) -> str:
+    return " OR ".join(f'"{t}"' for t in dict.fromkeys(TOKEN_RE.findall(text.lower())))
+
+def _authors(rec: dict) -> str:
+    return ", ".join(a.get("name", "") if isinstance(a, dict) else str(a) for a in rec.get("authors") or [])
+
+class PaperIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS papers (pid TEXT PRIMARY KEY, rec TEXT NOT NULL, seen REAL NOT NULL)")
+        self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(pid UNINDEXED, title, abstract, authors, venue, year, tokenize='porter unicode61')")
+
+    def add(self, papers: list[dict]):
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                for p in papers:
+                    pid = p.get("paperId")
+                    if not pid:
+                        continue
+                    rec = {k: v for k, v in p.items() if k != "insights" or v}
+                    old = self._db.execute("SELECT rec FROM papers WHERE pid=?", (pid,)).fetchone()
+                    if old:
+                        rec = {**json.loads(old[0]), **rec}
+                    self._db.execute("INSERT OR REPLACE INTO papers VALUES (?,?,?)", (pid, json.dumps(rec), now))
+                    self._db.execute("DELETE FROM papers_fts WHERE pid=?", (pid,))
+                    self._db.execute("INSERT INTO papers_fts VALUES (?,?,?,?,?,?)",
+                                     (pid, rec.get("title") or "", rec.get("abstract") or "", _authors(rec),
+                                      rec.get("venue") or "", str(rec.get("year") or "")))
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def update(self, pid: str, **fields):
+        with self._lock:
+            row = self._db.execute("SELECT rec FROM papers WHERE pid=?", (pid,)).fetchone()
+            if row:
+                self._db.execute("UPDATE papers SET rec=? WHERE pid=?", (json.dumps({**json.loads(row[0]), **fields}), pid))
+
+    def get(self, pid: str) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT rec FROM papers WHERE pid=?", (pid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def search(self, text: str, limit: int, offset: int = 0) -> list[dict]:
+        q = fts_query(text)
+        if not q or limit <= 0:
+            return []
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT p.rec FROM papers_fts f JOIN papers p ON p.pid = f.pid WHERE papers_fts MATCH ? "
+                "ORDER BY bm25(papers_fts, 0, 10.0, 1.0, 2.0, 1.0, 0.5) LIMIT ? OFFSET ?", (q, limit, offset)).fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def records(self) -> list[dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT rec FROM papers ORDER BY seen").fetchall()
+        return [json.loads(r[0]) for r in rows]
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM papers")
+            self._db.execute("DELETE FROM papers_fts")
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+def open_index(name: str = "index") -> PaperIndex | None:
+    try:
+        os.makedirs(cache.CACHE_DIR, exist_ok=True)
+        return PaperIndex(os.path.join(cache.CACHE_DIR, f"{name}.sqlite"))
+    except (OSError, sqlite3.Error) as e:
+        logging.error("Index %s: %s", name, e)
+        return None
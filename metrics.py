@@ -0,0 +1,111 @@
+from __future__ import annotations
+import os, json, time, atexit, functools, threading, logging
+from collections import deque
+from contextlib import contextmanager
+
+WINDOW = 1000
+QUANTILES = (0.5, 0.95, 0.99)
+DUMP_INTERVAL_S = 30
+
+class Histogram:
+    def __init__(self):
+        self.count = self.errors = self.bytes = self.hits = self.misses = self.revalidated = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=WINDOW)
+
+    def observe(self, seconds: float, nbytes: int = 0, cache: str | None = None, error: bool = False):
+        self.count += 1
+        self.total += seconds
+        self.bytes += nbytes
+        self.errors += error
+        self.hits += cache == "hit"
+        self.misses += cache == "miss"
+        self.revalidated += cache == "revalidated"
+        self.recent.append(seconds)
+
+    def snapshot(self) -> dict:
+        lat = sorted(self.recent)
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000 if lat else 0.0
+        out = {"count": self.count, "errors": self.errors, "bytes": self.bytes, "cache_hits": self.hits, "cache_misses": self.misses,
+               "cache_revalidated": self.revalidated,
+               "mean_ms": self.total / self.count * 1000 if self.count else 0.0, "max_ms": lat[-1] * 1000 if lat else 0.0}
+        out.update({f"p{int(q * 100)}_ms": pct(q) for q in QUANTILES})
+        return out
+
+_LOCK = threading.Lock()
+_HISTS: dict[str, Histogram] = {}
+
+def observe(name: str, seconds: float, nbytes: int = 0, cache: str | None = None, error: bool = False):
+    with _LOCK:
+        h = _HISTS.get(name)
+        if h is None:
+            h = _HISTS[name] = Histogram()
+        h.observe(seconds, nbytes, cache, error)
+
+@contextmanager
+def span(name: str):
+    rec = {"bytes": 0, "cache": None, "error": False}
+    t = time.perf_counter()
+    try:
+        yield rec
+    except BaseException:
+        rec["error"] = True
+        raise
+    finally:
+        observe(name, time.perf_counter() - t, rec["bytes"], rec["cache"], rec["error"])
+
+def timed(name: str):
+    def _wrap(fn):
+        @functools.wraps(fn)
+        def _inner(*a, **kw):
+            with span(name):
+                return fn(*a, **kw)
+        return _inner
+    return _wrap
+
+def snapshot(prefix: str = "") -> dict:
+    with _LOCK:
+        return {k: h.snapshot() for k, h in sorted(_HISTS.items()) if k.startswith(prefix)}
+
+def reset():
+    with _LOCK:
+        _HISTS.clear()
+
+def prometheus(snap: dict | None = None) -> str:
+    snap = snapshot() if snap is None else snap
+    lines = ["# TYPE ra_stage_seconds summary"]
+    for name, s in snap.items():
+        lbl = f'stage="{name}"'
+        lines += [f'ra_stage_seconds{{{lbl},quantile="{q}"}} {s[f"p{int(q * 100)}_ms"] / 1000:.6f}' for q in QUANTILES]
+        lines += [f"ra_stage_seconds_sum{{{lbl}}} {s['mean_ms'] * s['count'] / 1000:.6f}", f"ra_stage_seconds_count{{{lbl}}} {s['count']}"]
+    for metric, field in (("ra_stage_bytes_total", "bytes"), ("ra_stage_errors_total", "errors"),
+                          ("ra_stage_cache_hits_total", "cache_hits"), ("ra_stage_cache_misses_total", "cache_misses"),
+                          ("ra_stage_cache_revalidated_total", "cache_revalidated")):
+        lines.append(f"# TYPE {metric} counter")
+        lines += [f'{metric}{{stage="{name}"}} {s[field]}' for name, s in snap.items()]
+    return "\n".join(lines) + "\n"
+
+def dump(path: str):
+    snap = snapshot()
+    body = prometheus(snap) if path.endswith((".prom", ".txt")) else json.dumps({"at": time.time(), "stages": snap}, indent=1)
+    tmp = path + ".tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(body)
+        os.replace(tmp, path)
+    except OSError as e:
+        logging.error("Metrics dump %s: %s", path, e)
+
+_dumper: threading.Thread | None = None
+
+def dump_periodically(path: str, interval: float = DUMP_INTERVAL_S):
+    global _dumper
+    if _dumper:
+        return
+    def _loop():
+        while True:
+            time.sleep(interval)
+            dump(path)
+    _dumper = threading.Thread(target=_loop, name="metrics-dump", daemon=True)
+    _dumper.start()
+    atexit.register(dump, path)
@@ -0,0 +1,43 @@
+from __future__ import annotations
+import time, threading
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self._lock = threading.Lock()
+        self.configure(rate, burst)
+        self._tokens = float(self.burst)
+        self._t = time.monotonic()
+
+    def configure(self, rate: float, burst: int):
+        if rate <= 0 or burst < 1:
+            raise ValueError("rate must be > 0 and burst >= 1")
+        with self._lock:
+            self.rate, self.burst = float(rate), int(burst)
+
+    def _refill(self, now: float):
+        self._tokens = min(self.burst, self._tokens + (now - self._t) * self.rate)
+        self._t = now
+
+    def reserve(self, n: int = 1) -> float:
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= n
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    def try_acquire(self, n: int = 1) -> bool:
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens < n:
+                return False
+            self._tokens -= n
+            return True
+
+    def acquire(self, n: int = 1):
+        delay = self.reserve(n)
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds: float):
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
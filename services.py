@@ -0,0 +1,191 @@
+from __future__ import annotations
+import os, time, json, urllib.parse, logging, threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+import google.generativeai as genai
+import cache, ratelimit, transport
+
+GEMINI_MODEL = "gemini-1.5-flash-latest"
+GEMINI_HOST = "generativelanguage.googleapis.com"
+GEMINI_OUTPUT_TOKENS = 8192
+SERVICE_CONCURRENCY = {"arxiv": 1, "s2": 2, "gemini": 4}
+RATE_LIMITS = {"arxiv": (1 / 3, 1), "s2": (1.0, 1), "gemini": (2.0, 4)}
+RETRY_429 = 2
+LLM_CACHE_TTL = 30 * 86400
+LLM_CACHE_BYTES = 64 * 1024 * 1024
+HTTP_CACHE_BYTES = 128 * 1024 * 1024
+HTTP_CACHE_MAX_AGE = 7 * 86400
+HTTP_TTLS = {"arxiv_search": 6 * 3600, "arxiv_id": 7 * 86400, "s2_search": 6 * 3600, "s2_paper": 86400}
+HTTP_TIMEOUT = 20
+HTTP_CONNECT_TIMEOUT = 5
+HTTP_POOL_SIZE = 8
+
+LLM_CACHE = cache.open_cache("llm", LLM_CACHE_TTL, LLM_CACHE_BYTES)
+HTTP_CACHE = cache.open_cache("http", HTTP_CACHE_MAX_AGE, HTTP_CACHE_BYTES)
+SLOTS = {k: threading.BoundedSemaphore(v) for k, v in SERVICE_CONCURRENCY.items()}
+BUCKETS = {k: ratelimit.TokenBucket(*v) for k, v in RATE_LIMITS.items()}
+TRANSPORT = transport.Transport(HTTP_POOL_SIZE, (HTTP_CONNECT_TIMEOUT, HTTP_TIMEOUT))
+
+def configure_rate(service: str, rate: float, burst: int = 1):
+    BUCKETS[service].configure(rate, burst)
+
+@contextmanager
+def slot(service: str):
+    with SLOTS[service]:
+        BUCKETS[service].acquire()
+        yield
+
+def backoff(service: str, headers):
+    ra = headers.get("Retry-After", "")
+    wait = float(ra) if ra.isdigit() else 1 / BUCKETS[service].rate
+    logging.warning("%s throttled, backing off %.1fs", service, wait)
+    BUCKETS[service].pause(wait)
+
+def _once(fn):
+    done = False
+    value = None
+    def _wrapper(*a, **kw):
+        nonlocal done, value
+        if not done:
+            value, done = fn(*a, **kw), True
+        return value
+    return _wrapper
+
+@_once
+def configure_gemini() -> bool:
+    k = os.getenv("GOOGLE_API_KEY")
+    if not k:
+        logging.warning("GOOGLE_API_KEY not set")
+        return False
+    try:
+        genai.configure(api_key=k)
+        return True
+    except Exception as e:
+        logging.error("Gemini configure: %s", e)
+        return False
+
+def norm_url(url: str, params: dict | None) -> str:
+    u = urllib.parse.urlsplit(url)
+    qs = urllib.parse.parse_qsl(u.query) + [(k, str(v)) for k, v in (params or {}).items()]
+    return urllib.parse.urlunsplit((u.scheme.lower(), u.netloc.lower(), u.path.rstrip("/"), urllib.parse.urlencode(sorted(qs)), ""))
+
+def _http_entry(ck: str) -> dict | None:
+    raw = HTTP_CACHE.get(ck) if HTTP_CACHE else None
+    return json.loads(raw) if raw else None
+
+def http_fresh(endpoint: str, url: str, params: dict | None = None) -> str | None:
+    entry = _http_entry(cache.key(norm_url(url, params)))
+    if entry and time.time() - entry["at"] < HTTP_TTLS.get(endpoint, 0):
+        return entry["body"]
+    return None
+
+def http_remember(url: str, params: dict | None, body: str):
+    if HTTP_CACHE:
+        HTTP_CACHE.put(cache.key(norm_url(url, params)), json.dumps({"body": body, "etag": None, "lm": None, "at": time.time()}))
+
+def http_prepare(endpoint: str, url: str, params: dict | None, headers: dict | None):
+    ck = cache.key(norm_url(url, params))
+    entry = _http_entry(ck)
+    if entry and time.time() - entry["at"] < HTTP_TTLS.get(endpoint, 0):
+        return ck, entry, entry["body"], None
+    hdrs = dict(headers or {})
+    if entry and entry.get("etag"):
+        hdrs["If-None-Match"] = entry["etag"]
+    if entry and entry.get("lm"):
+        hdrs["If-Modified-Since"] = entry["lm"]
+    return ck, entry, None, hdrs
+
+def http_finish(ck: str, entry: dict | None, status: int, headers, text: str) -> str:
+    if status == 304 and entry:
+        body = entry["body"]
+    else:
+        body = text
+        entry = {"body": body, "etag": headers.get("ETag"), "lm": headers.get("Last-Modified")}
+    if HTTP_CACHE:
+        entry["at"] = time.time()
+        HTTP_CACHE.put(ck, json.dumps(entry))
+    return body
+
+def loads(service: str, endpoint: str, body: str | None):
+    try:
+        return json.loads(body) if body else None
+    except ValueError as e:
+        logging.error("%s %s: %s", service, endpoint, e)
+        return None
+
+def cached(ck: str) -> str | None:
+    return LLM_CACHE.get(ck) if LLM_CACHE else None
+
+def store(ck: str, value: str):
+    if LLM_CACHE and value:
+        LLM_CACHE.put(ck, value)
+
+def json_object(raw: str) -> dict | None:
+    for cand in (raw, raw[raw.find("{"):raw.rfind("}") + 1]):
+        try:
+            data = json.loads(cand)
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            return data
+    return None
+
+def rsp_text(rsp) -> str:
+    try:
+        return getattr(rsp, "text", None) or (rsp.parts[0].text if rsp.parts else "")
+    except (ValueError, AttributeError, IndexError):
+        return ""
+
+def gemini_key(prompt: str, json_mode: bool) -> str:
+    return cache.key(GEMINI_MODEL, "json" if json_mode else "text", prompt)
+
+def gemini_config(json_mode: bool) -> dict | None:
+    return {"response_mime_type": "application/json"} if json_mode else None
+
+def cacheable(text: str, json_mode: bool) -> bool:
+    return bool(text) and (not json_mode or json_object(text) is not None)
+
+class Flight:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.chunks: list[str] = []
+        self.subs: list = []
+        self.future: Future = Future()
+
+    def chunk(self, t: str):
+        with self.lock:
+            self.chunks.append(t)
+            for fn in self.subs:
+                fn(t)
+
+    def follow(self, on_chunk):
+        if on_chunk:
+            with self.lock:
+                for t in self.chunks:
+                    on_chunk(t)
+                self.subs.append(on_chunk)
+
+    def unfollow(self, on_chunk, text: str | None):
+        if on_chunk:
+            with self.lock:
+                self.subs.remove(on_chunk)
+                replay = text and not self.chunks
+            if replay:
+                on_chunk(text)
+
+_FLIGHT_LOCK = threading.Lock()
+_FLIGHTS: dict[str, Flight] = {}
+
+def flight(ck: str) -> tuple[Flight, bool]:
+    with _FLIGHT_LOCK:
+        f = _FLIGHTS.get(ck)
+        if f:
+            return f, False
+        f = _FLIGHTS[ck] = Flight()
+        return f, True
+
+def land(ck: str, f: Flight, text: str | None):
+    with _FLIGHT_LOCK:
+        if _FLIGHTS.get(ck) is f:
+            del _FLIGHTS[ck]
+    f.future.set_result(text)
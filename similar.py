@@ -0,0 +1,106 @@
+from __future__ import annotations
+import re, threading
+import numpy as np
+import scipy.sparse as sp
+
+K1 = 1.5
+B = 0.75
+MIN_SCORE = 0.5
+TOKEN_RE = re.compile(r"[a-z][a-z0-9\-]+")
+STOPWORDS = frozenset("""
+a about above after again against all also an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having here how however i if in into is
+it its itself just more most new no nor not of off on once only or other our out over own paper propose proposed same
+show shows so some such than that the their them then there these they this those through to too under until up use
+used using very via was we were what when where which while who whom why will with within without would yet
+""".split())
+
+def tokens(text: str) -> list[str]:
+    return [t for t in TOKEN_RE.findall((text or "").lower()) if len(t) > 2 and t not in STOPWORDS]
+
+class SimilarityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._vocab: dict[str, int] = {}
+        self._rows: dict[str, int] = {}
+        self._meta: list[dict] = []
+        self._blocks: list[sp.csr_matrix] = []
+        self._tf: sp.csr_matrix | None = None
+        self._weights: sp.csr_matrix | None = None
+
+    def __len__(self) -> int:
+        return len(self._meta)
+
+    def add(self, papers: list[dict]) -> int:
+        data, cols, indptr, meta = [], [], [0], []
+        with self._lock:
+            for p in papers:
+                pid = p.get("paperId")
+                if not pid or pid in self._rows:
+                    continue
+                toks = tokens(f"{p.get('title') or ''} {p.get('abstract') or ''}")
+                if not toks:
+                    continue
+                counts: dict[int, int] = {}
+                for t in toks:
+                    c = self._vocab.setdefault(t, len(self._vocab))
+                    counts[c] = counts.get(c, 0) + 1
+                cols.extend(counts)
+                data.extend(counts.values())
+                indptr.append(len(cols))
+                self._rows[pid] = len(self._meta) + len(meta)
+                meta.append({"paperId": pid, "title": p.get("title", ""), "source": p.get("source", "")})
+            if meta:
+                self._blocks.append(sp.csr_matrix((np.array(data, dtype=np.float32), np.array(cols, dtype=np.int32), np.array(indptr)),
+                                                  shape=(len(meta), len(self._vocab))))
+                self._meta.extend(meta)
+                self._weights = None
+        return len(meta)
+
+    def _matrix(self) -> sp.csr_matrix:
+        if self._weights is not None:
+            return self._weights
+        v = len(self._vocab)
+        parts = ([self._tf] if self._tf is not None else []) + self._blocks
+        for i, m in enumerate(parts):
+            if m.shape[1] < v:
+                m.resize((m.shape[0], v))
+                parts[i] = m
+        tf = self._tf = sp.vstack(parts, format="csr") if len(parts) > 1 else parts[0]
+        self._blocks = []
+        n = tf.shape[0]
+        df = np.bincount(tf.indices, minlength=v)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        dl = np.asarray(tf.sum(axis=1)).ravel()
+        norm = K1 * (1 - B + B * dl / dl.mean())
+        rep = np.repeat(norm, np.diff(tf.indptr)).astype(np.float32)
+        w = tf.copy()
+        w.data = idf[w.indices] * w.data * (K1 + 1) / (w.data + rep)
+        self._weights = w
+        return w
+
+    def _queries(self, texts: list[str]) -> sp.csr_matrix:
+        cols, indptr = [], [0]
+        for text in texts:
+            cols.extend(sorted({self._vocab[t] for t in tokens(text) if t in self._vocab}))
+            indptr.append(len(cols))
+        return sp.csr_matrix((np.ones(len(cols), dtype=np.float32), np.array(cols, dtype=np.int32), np.array(indptr)),
+                             shape=(len(texts), len(self._vocab)))
+
+    def similar_many(self, texts: list[str], k: int, exclude: list[str | None] | None = None) -> list[list[dict]]:
+        with self._lock:
+            if not self._meta or k <= 0:
+                return [[] for _ in texts]
+            scores = (self._queries(texts) @ self._matrix().T).toarray()
+            out = []
+            for i, row in enumerate(scores):
+                skip = self._rows.get(exclude[i]) if exclude and exclude[i] else None
+                if skip is not None:
+                    row[skip] = 0
+                top = np.argpartition(-row, min(k, len(row) - 1))[:k + 1]
+                top = top[np.argsort(-row[top])]
+                out.append([dict(self._meta[j]) for j in top if row[j] >= MIN_SCORE][:k])
+            return out
+
+    def similar(self, text: str, k: int, exclude: str | None = None) -> list[dict]:
+        return self.similar_many([text], k, [exclude])[0]
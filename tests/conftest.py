@@ -0,0 +1,4 @@
+import os, sys, tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ["RA_CACHE_DIR"] = tempfile.mkdtemp(prefix="ra-tests-")
@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip("ttkbootstrap")
+gui = pytest.importorskip("gui")
+
+TEXT = "Intro with **bold words** and *an aside*.\nSecond line *x* **y**\nTail **open"
+
+def _collect(text, step):
+    md = gui.MarkdownStream()
+    segs = []
+    for i in range(0, len(text), step):
+        segs += md.feed(text[i:i + step])
+    return segs + md.feed("", final=True)
+
+def _merge(segs):
+    out = []
+    for t, tags in segs:
+        if out and out[-1][1] == tags:
+            out[-1] = (out[-1][0] + t, tags)
+        elif t:
+            out.append((t, tags))
+    return out
+
+@pytest.mark.parametrize("step", [1, 2, 3, 4, 7, 11])
+def test_stream_matches_whole_text_at_any_chunk_boundary(step):
+    assert _merge(_collect(TEXT, step)) == _merge(gui.md_segments(TEXT))
+
+def test_unclosed_marker_is_held_until_final():
+    md = gui.MarkdownStream()
+    assert _merge(md.feed("a **bo")) == [("a ", ())]
+    assert _merge(md.feed("ld** b")) == [("bold", ("bold",)), (" b", ())]
+    assert md.feed("", final=True) == []
+
+def test_final_flushes_dangling_marker_as_text():
+    md = gui.MarkdownStream()
+    md.feed("x *half")
+    assert _merge(md.feed("", final=True)) == [("*half", ())]
@@ -0,0 +1,92 @@
+import json
+from types import SimpleNamespace
+import pytest
+import backend
+
+def _stream(raw: str, step: int) -> tuple[str, backend._EssayStream]:
+    s = backend._EssayStream()
+    out = "".join(s.feed(raw[i:i + step]) for i in range(0, len(raw), step))
+    return out, s
+
+ESSAY = 'Line one\n"quoted" \\ back\ttab é \U0001F600 end'
+
+@pytest.mark.parametrize("step", [1, 2, 3, 5, 7, 1000])
+def test_essay_stream_matches_json_at_any_chunk_boundary(step):
+    raw = json.dumps({"essay": ESSAY, "related": []})
+    out, s = _stream(raw, step)
+    assert out == ESSAY and s.text == ESSAY and s.done
+
+def test_essay_stream_split_escape_waits_for_rest():
+    s = backend._EssayStream()
+    assert s.feed('{"essay": "a\\') == "a"
+    assert s.feed("n") == "\n"
+    assert s.feed("b\\u00") == "b"
+    assert s.feed('e9"') == "é"
+
+def test_essay_stream_surrogate_pair_split_between_escapes():
+    s = backend._EssayStream()
+    assert s.feed('{"essay": "x\\ud83d') == "x"
+    assert s.feed("\\ud") == ""
+    assert s.feed('e00 y"') == "\U0001F600 y"
+
+def test_essay_stream_lone_surrogates_are_replaced():
+    out, _ = _stream('{"essay": "a\\ud83d b \\ude00 c"}', 1)
+    assert out == "a� b � c"
+    out.encode("utf-8")
+
+def test_essay_stream_truncated_input_keeps_prefix():
+    out, s = _stream('{"essay": "partial essay \\u00', 4)
+    assert out == "partial essay " and not s.done
+
+def test_essay_stream_ignores_text_before_key():
+    s = backend._EssayStream()
+    assert s.feed('```json\n{"ess') == ""
+    assert s.feed('ay": "ok"}') == "ok"
+
+def _paper(pid):
+    return {"paperId": pid, "abstract": f"abstract of {pid}"}
+
+def test_parse_batch_keeps_valid_entries_only():
+    rel = [{"id_type": "arxiv", "id": "2101.00001", "title": "A"}, {"id_type": "bogus", "id": "x", "title": "B"}]
+    raw = "Here you go:\n" + json.dumps({"p1": {"essay": " E1 ", "related": rel}, "p2": {"essay": ""}, "p3": "nope"})
+    out = backend._parse_batch(raw, [_paper("p1"), _paper("p2"), _paper("p3"), _paper("p4")])
+    assert list(out) == ["p1"]
+    assert out["p1"] == {"essay": "E1", "related": rel[:1]}
+
+def test_parse_batch_malformed_returns_nothing():
+    assert backend._parse_batch("not json at all", [_paper("p1")]) == {}
+    assert backend._parse_batch("", [_paper("p1")]) == {}
+
+def _entry(rid, title, doi=None):
+    return SimpleNamespace(id=f"http://arxiv.org/abs/{rid}", title=title, arxiv_doi=doi)
+
+def test_dedup_merges_across_sources_by_arxiv_id_title_and_doi():
+    arxiv = [_entry("2101.00001v2", "Graph Nets"), _entry("2101.00002v1", "Other Paper", doi="10.1/X")]
+    s2 = [{"paperId": "a", "title": "Something Else", "externalIds": {"ArXiv": "2101.00001"}},
+          {"paperId": "b", "title": "other  paper!", "externalIds": {}},
+          {"paperId": "c", "title": "New", "externalIds": {"DOI": "10.1/x"}},
+          {"paperId": "d", "title": "Only S2", "externalIds": {}}]
+    groups = backend._dedup(arxiv, s2)
+    assert [(e and e.title, d and d["paperId"]) for e, d in groups] == \
+        [("Graph Nets", "a"), ("Other Paper", "b"), (None, "d")]
+
+def test_dedup_skips_seen_and_records_new_keys():
+    seen = set()
+    backend._dedup([_entry("2101.00001v1", "Graph Nets")], [], seen)
+    groups = backend._dedup([_entry("2101.00001v3", "Graph Nets v3")], [{"paperId": "z", "title": "graph nets", "externalIds": {}}], seen)
+    assert groups == []
+
+def test_parse_batch_truncated_keeps_finished_answers():
+    full = json.dumps({"p1": {"essay": "E1", "related": []}, "p2": {"essay": "E2 {\"x\"}", "related": []},
+                       "p3": {"essay": "E3 long", "related": []}})
+    raw = "```json\n" + full[:full.index('"p3"') + 20]
+    out = backend._parse_batch(raw, [_paper("p1"), _paper("p2"), _paper("p3")])
+    assert {k: v["essay"] for k, v in out.items()} == {"p1": "E1", "p2": 'E2 {"x"}'}
+
+def test_pack_batches_respects_input_and_output_budgets():
+    papers = [_paper(f"p{i}") for i in range(10)]
+    per_out = backend.services.GEMINI_OUTPUT_TOKENS // backend.ESSAY_OUTPUT_TOKENS
+    batches = backend._pack_batches(papers, [10] * 10, 5, 10_000)
+    assert max(map(len, batches)) == min(backend.ESSAY_BATCH_MAX, per_out)
+    assert [len(b) for b in backend._pack_batches(papers[:4], [40, 40, 40, 40], 20, 100)] == [2, 2]
+    assert sum(batches, []) == papers
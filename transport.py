@@ -0,0 +1,85 @@
+from __future__ import annotations
+import time, threading, urllib.parse
+from collections import deque
+import requests
+from requests.adapters import HTTPAdapter
+
+LATENCY_WINDOW = 500
+
+class _HostStats:
+    def __init__(self):
+        self.requests = self.errors = 0
+        self.total = 0.0
+        self.recent = deque(maxlen=LATENCY_WINDOW)
+
+    def snapshot(self, connections: int) -> dict:
+        lat = sorted(self.recent)
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000 if lat else 0.0
+        return {"requests": self.requests, "errors": self.errors, "connections": connections,
+                "mean_ms": self.total / self.requests * 1000 if self.requests else 0.0,
+                "p50_ms": pct(0.5), "p95_ms": pct(0.95), "max_ms": lat[-1] * 1000 if lat else 0.0}
+
+class Transport:
+    def __init__(self, pool_size: int = 8, timeout: tuple[float, float] = (5, 20)):
+        self.pool_size, self.timeout = pool_size, timeout
+        self._lock = threading.Lock()
+        self._sessions: dict[str, requests.Session] = {}
+        self._stats: dict[str, _HostStats] = {}
+
+    def configure(self, pool_size: int | None = None, timeout: tuple[float, float] | None = None):
+        with self._lock:
+            self.pool_size = pool_size or self.pool_size
+            self.timeout = timeout or self.timeout
+            old, self._sessions = self._sessions, {}
+        for s in old.values():
+            s.close()
+
+    def session(self, host: str) -> requests.Session:
+        with self._lock:
+            s = self._sessions.get(host)
+            if s is None:
+                s = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                s.mount("http://", adapter)
+                s.mount("https://", adapter)
+                self._sessions[host] = s
+                self._stats.setdefault(host, _HostStats())
+            return s
+
+    def request(self, method: str, url: str, **kw) -> requests.Response:
+        host = urllib.parse.urlsplit(url).netloc.lower()
+        s = self.session(host)
+        kw.setdefault("timeout", self.timeout)
+        t = time.perf_counter()
+        try:
+            r = s.request(method, url, **kw)
+        except requests.RequestException:
+            self.record(host, time.perf_counter() - t, True)
+            raise
+        self.record(host, time.perf_counter() - t, r.status_code >= 400)
+        return r
+
+    def record(self, host: str, elapsed: float, error: bool):
+        with self._lock:
+            st = self._stats.setdefault(host, _HostStats())
+            st.requests += 1
+            st.errors += error
+            st.total += elapsed
+            st.recent.append(elapsed)
+
+    def _connections(self, host: str) -> int:
+        s = self._sessions.get(host)
+        if s is None:
+            return 0
+        pools = s.get_adapter("https://" + host).poolmanager.pools
+        return sum(getattr(pools[k], "num_connections", 0) for k in pools.keys())
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {h: st.snapshot(self._connections(h)) for h, st in self._stats.items()}
+
+    def close(self):
+        with self._lock:
+            old, self._sessions = self._sessions, {}
+        for s in old.values():
+            s.close()